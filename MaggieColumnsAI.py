@@ -0,0 +1,219 @@
+# MaggieColumnsAI
+# This module implements a computer player. For every faller it tries each column and rotation on a copy of the board,
+# resolves the matches each placement would cause, and picks the placement that heuristics like best.
+#
+# Example: python MaggieColumnsAI.py --games 20 --beam 4 --budget 0.05
+
+import argparse
+import time
+from collections import namedtuple
+
+import MaggieColumnsModel
+
+# The result of dropping a faller into a column with some number of rotations.
+# board is the copy of the board after the drop and all the matches it caused. game_over is True if the faller would freeze partly hidden.
+Placement = namedtuple('Placement', ['column', 'rotations', 'board', 'score_delta', 'chain', 'game_over'])
+
+
+# Heuristics. Each takes the board before a placement and the Placement, and returns a number where higher is better.
+def score_gained(board: MaggieColumnsModel.Board, placement: Placement) -> float:
+    return placement.score_delta
+
+def chain_length(board: MaggieColumnsModel.Board, placement: Placement) -> float:
+    return placement.chain ** 2
+
+def stack_height(board: MaggieColumnsModel.Board, placement: Placement) -> float:
+    """The height of the tallest column, negated so that lower stacks are better."""
+    return -max(column_heights(placement.board))
+
+def bumpiness(board: MaggieColumnsModel.Board, placement: Placement) -> float:
+    """The total difference in height between neighbouring columns, negated so that flatter stacks are better."""
+    heights = column_heights(placement.board)
+    return -sum(abs(left - right) for left, right in zip(heights, heights[1:]))
+
+# (weight, heuristic) pairs used when an AutoPlayer is not given its own.
+DEFAULT_HEURISTICS = [
+    (1.0, score_gained),
+    (20.0, chain_length),
+    (15.0, stack_height),
+    (4.0, bumpiness),
+]
+
+
+def column_heights(board: MaggieColumnsModel.Board) -> [int]:
+    """Return the number of occupied visible cells in each column. Gravity keeps every column packed at the bottom."""
+    cells, rows, hidden_rows = board.to_bytes(), board.rows(), board.hidden_rows()
+    # Stripping the empty cells off the top of a column's bytes leaves its stack, without a loop in Python, which matters on tall boards.
+    return [len(cells[col * rows + hidden_rows:(col + 1) * rows].lstrip(b'\x00')) for col in range(board.columns())]
+
+
+def _stack_top(board: MaggieColumnsModel.Board, col: int) -> int:
+    """Return the row of the highest occupied cell in a column, or the number of rows if the column is empty."""
+    rows = board.rows()
+    column = board.to_bytes()[col * rows + board.hidden_rows():(col + 1) * rows]
+    return rows - len(column.lstrip(b'\x00'))
+
+
+def _rotated(jewels: (int,), rotations: int) -> (int,):
+    """Return the jewels of a faller, top to bottom, after it has been rotated some number of times. See Faller.rotate()."""
+    rotations %= len(jewels)
+    return jewels[len(jewels) - rotations:] + jewels[:len(jewels) - rotations]
+
+
+def simulate_placement(board: MaggieColumnsModel.Board, jewels: (int,), column: int, rotations: int) -> Placement:
+    """Drop a faller with the given jewels into a column on a copy of the board, and resolve every match it causes."""
+    after = board.clone()
+    jewels = _rotated(jewels, rotations)
+    top_row = _stack_top(after, column) - len(jewels)
+    if top_row < after.hidden_rows():
+        return Placement(column, rotations, after, 0, 0, True)
+    for offset, jewel in enumerate(jewels):
+        after.set_cell(column, top_row + offset, MaggieColumnsModel.encode_cell(jewel, MaggieColumnsModel.FROZEN))
+    steps = after.resolve_cascade()
+    return Placement(column, rotations, after, sum(step.score_delta for step in steps), len(steps), False)
+
+
+class AutoPlayer:
+    """Chooses where to put each faller.
+
+    heuristics is a list of (weight, function) pairs, see DEFAULT_HEURISTICS. A placement's value is the weighted sum of the functions.
+    With a beam_width above 0, the best beam_width placements of the current faller are each followed by every placement of the next faller,
+    and the best follow-up counts towards the value (times lookahead_weight).
+    A decision never takes much longer than time_budget seconds, however wide the board: the budget is checked after every placement
+    that is tried, and once it runs out, the best placement found so far is used.
+    """
+
+    def __init__(self, heuristics: [(float, 'function')] = None, beam_width: int = 0, lookahead_weight: float = 0.9, time_budget: float = 0.05):
+        self._heuristics = heuristics if heuristics else DEFAULT_HEURISTICS
+        self._beam_width = beam_width
+        self._lookahead_weight = lookahead_weight
+        self._time_budget = time_budget
+        self._placements_evaluated = 0
+        self._seconds_spent = 0.0
+
+    def evaluate(self, board: MaggieColumnsModel.Board, placement: Placement) -> float:
+        if placement.game_over:
+            return float('-inf')
+        return sum(weight * heuristic(board, placement) for weight, heuristic in self._heuristics)
+
+    def choose(self, board: MaggieColumnsModel.Board, faller: MaggieColumnsModel.Faller, next_faller: MaggieColumnsModel.Faller = None) -> Placement:
+        """Return the best Placement for the faller, which must have been inserted into the board. next_faller is only used for the beam search."""
+        start = time.perf_counter()
+        deadline = start + self._time_budget
+        jewels = tuple(piece.jewel() for piece in faller)
+        # Placements are simulated on a board without the faller in it.
+        board = board.clone()
+        for col, row in faller.cells():
+            board.set_cell(col, row, MaggieColumnsModel.EMPTY)
+        candidates = []
+        rotation_counts = self._distinct_rotations(jewels)
+        for column, rotations in ((column, rotations) for column in self.reachable_columns(board, faller) for rotations in rotation_counts):
+            if candidates and time.perf_counter() > deadline:
+                break # Out of time, so the best of the placements tried so far is used.
+            placement = simulate_placement(board, jewels, column, rotations)
+            candidates.append((self.evaluate(board, placement), placement))
+            self._placements_evaluated += 1
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+
+        best_value, best = candidates[0]
+        if next_faller is not None and self._beam_width:
+            next_jewels = tuple(piece.jewel() for piece in next_faller)
+            best_value = float('-inf')
+            for value, placement in candidates[:self._beam_width]:
+                if placement.game_over or time.perf_counter() > deadline:
+                    break
+                # The next faller spawns in a random column, so every column is considered for it.
+                follow_up = self._best_follow_up(placement, next_jewels, deadline)
+                if follow_up is None: # Out of time before every follow-up was tried, so this placement is left out.
+                    break
+                total = value + self._lookahead_weight * follow_up
+                if total > best_value:
+                    best_value, best = total, placement
+            if best_value == float('-inf'):
+                best = candidates[0][1]
+        self._seconds_spent += time.perf_counter() - start
+        return best
+
+    def _best_follow_up(self, placement: Placement, next_jewels: (int,), deadline: float) -> float:
+        """Return the value of the best placement of the next faller after a placement, or None if the deadline passes first."""
+        follow_up = float('-inf')
+        for column in range(placement.board.columns()):
+            for rotations in self._distinct_rotations(next_jewels):
+                next_placement = simulate_placement(placement.board, next_jewels, column, rotations)
+                follow_up = max(follow_up, self.evaluate(placement.board, next_placement))
+                self._placements_evaluated += 1
+                if time.perf_counter() > deadline:
+                    return None
+        return follow_up
+
+    def plan(self, board: MaggieColumnsModel.Board, faller: MaggieColumnsModel.Faller, next_faller: MaggieColumnsModel.Faller = None) -> [str]:
+        """Return the actions (see MaggieColumnsModel.ACTIONS) that put the faller where choose() wants it: rotations, moves and then a drop."""
+        return self.actions(faller, self.choose(board, faller, next_faller))
+
+    def actions(self, faller: MaggieColumnsModel.Faller, placement: Placement) -> [str]:
+        """Return the actions that take the faller, as it is now, to a placement: rotations, moves and then a drop."""
+        moves = placement.column - faller.column_num
+        return ([MaggieColumnsModel.ROTATE] * placement.rotations
+                + [MaggieColumnsModel.RIGHT if moves > 0 else MaggieColumnsModel.LEFT] * abs(moves)
+                + [MaggieColumnsModel.DROP])
+
+    def reachable_columns(self, board: MaggieColumnsModel.Board, faller: MaggieColumnsModel.Faller) -> [int]:
+        """Return the columns the faller can be moved to from where it is, stopping at any column whose cell beside its bottom piece is taken."""
+        column, bottom_row = faller.cells()[-1]
+        columns = [column]
+        for step in (-1, 1):
+            next_column = column + step
+            while 0 <= next_column < board.columns() and board.cell(next_column, bottom_row) == MaggieColumnsModel.EMPTY:
+                columns.append(next_column)
+                next_column += step
+        return columns
+
+    def stats(self) -> dict:
+        """Return how many placements have been evaluated, the time spent choosing, and the placements evaluated per second."""
+        return {
+            'placements': self._placements_evaluated,
+            'seconds': self._seconds_spent,
+            'placements_per_second': self._placements_evaluated / self._seconds_spent if self._seconds_spent else 0.0,
+        }
+
+    @staticmethod
+    def _distinct_rotations(jewels: (int,)) -> [int]:
+        """Return the rotation counts that give different orders of jewels. A faller of identical jewels only needs one."""
+        seen = set()
+        rotations = []
+        for count in range(len(jewels)):
+            order = _rotated(jewels, count)
+            if order not in seen:
+                seen.add(order)
+                rotations.append(count)
+        return rotations
+
+
+def play(player: AutoPlayer, seed: int, max_fallers: int = 1000) -> MaggieColumnsModel.Game:
+    """Play a headless game with the player until it ends or max_fallers fallers have been placed, and return the finished Game."""
+    game = MaggieColumnsModel.Game(seed)
+    while not game.is_over() and game.pieces_placed() < max_fallers:
+        for action in player.plan(game.board(), game.current_faller(), game.next_faller()):
+            game.step(action)
+    return game
+
+
+def main(argv: [str] = None) -> None:
+    parser = argparse.ArgumentParser(description='Let the computer player play headless games of MaggieColumns.')
+    parser.add_argument('--games', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game; each following game uses the next seed')
+    parser.add_argument('--beam', type=int, default=0, help='placements of the current faller to search the next faller after (0 turns lookahead off)')
+    parser.add_argument('--budget', type=float, default=0.05, help='seconds allowed for each decision')
+    parser.add_argument('--max-fallers', type=int, default=1000, help='fallers after which a game is stopped')
+    args = parser.parse_args(argv)
+
+    player = AutoPlayer(beam_width=args.beam, time_budget=args.budget)
+    for seed in range(args.seed, args.seed + args.games):
+        game = play(player, seed, args.max_fallers)
+        print(f'seed {seed}: score {game.score()}, {game.pieces_placed()} fallers{"" if game.is_over() else " (stopped)"}')
+    stats = player.stats()
+    print(f'{stats["placements"]} placements in {stats["seconds"]:.2f}s, {stats["placements_per_second"]:.0f} placements per second')
+
+
+if __name__ == '__main__':
+    main()
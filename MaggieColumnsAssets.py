@@ -0,0 +1,256 @@
+# MaggieColumnsAssets
+# This module loads the images and sounds of the game off the main thread, so the window can be shown before they are ready.
+# Scaled images are cached on disk as raw pixels, since decoding the full size background PNG is the slowest part of startup.
+# Once the game is running, the decoded PNGs are kept in memory, so the window can be resized without reading them again.
+#
+# Example:
+#   loader = AssetLoader((1120, 630), (45, 45)); loader.start()
+#   ... draw with placeholder_images((1120, 630), (45, 45)) until loader.ready(), then use convert_images(loader.images())
+
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+import pygame
+
+ASSET_DIR = './assets'
+CACHE_DIR = './assets/cache' # Scaled images. Safe to delete; it is rebuilt as images are needed.
+
+# Image names used by the view, and the files they are loaded from. 'BG' is scaled to the window, everything else to a board cell.
+IMAGE_FILES = {
+    'BG': 'BG_work.png',
+    'H': 'Smile.png',
+    'S': 'Pout.png',
+    'M': 'Moustache.png',
+    'R': 'Rude.png',
+    'G': 'Sparkle.png',
+    'L': 'Lick.png',
+    'B': 'BlownUp.png',
+    'O': 'Donut.png',
+    'Falling': 'Falling.png',
+    'Landed': 'Landed.png',
+    'Matched': 'Matched.png',
+}
+# Sound names, their files and volumes.
+SOUND_FILES = {
+    'rotate': ('swish.wav', 0.25),
+    'landed': ('landed.wav', 1.0),
+    'match': ('match.wav', 1.0),
+}
+MUSIC_FILE = ('ttm.mp3', 0.1)
+
+# Colors that stand in for each sticker while the real images load.
+_PLACEHOLDER_COLORS = {
+    'H': (240, 200, 60), 'S': (90, 140, 230), 'M': (150, 100, 60), 'R': (220, 70, 70),
+    'G': (200, 120, 230), 'L': (240, 130, 170), 'B': (90, 200, 120), 'O': (250, 170, 90),
+}
+_PLACEHOLDER_BACKGROUND = (236, 222, 236)
+
+# Header of a cached image: magic, width, height, and the modification time and size of the PNG it was scaled from.
+_CACHE_HEADER = struct.Struct('<4sHHqq')
+_CACHE_MAGIC = b'MGIC'
+
+
+def image_size(name: str, surface_size: (int, int), cell_size: (int, int)) -> (int, int):
+    return surface_size if name == 'BG' else cell_size
+
+
+def load_image(name: str, size: (int, int)) -> pygame.Surface:
+    """Return the named image scaled to size, as an RGBA surface that is not yet converted to the display's format.
+
+    The scaled pixels come from the disk cache if the PNG has not changed since they were cached. Otherwise the PNG is decoded
+    and scaled, and the result is written to the cache. This does not need the display, so it can run on any thread.
+    """
+    path = os.path.join(ASSET_DIR, IMAGE_FILES[name])
+    source = os.stat(path)
+    cache_path = os.path.join(CACHE_DIR, f'{name}-{size[0]}x{size[1]}.rgba')
+    try:
+        with open(cache_path, 'rb') as cache_file:
+            magic, width, height, mtime, file_size = _CACHE_HEADER.unpack(cache_file.read(_CACHE_HEADER.size))
+            if (magic, (width, height), mtime, file_size) == (_CACHE_MAGIC, tuple(size), source.st_mtime_ns, source.st_size):
+                return pygame.image.frombytes(cache_file.read(), size, 'RGBA')
+    except (OSError, struct.error, ValueError):
+        pass # Not cached yet, or the cache file is unreadable. Either way, decode the PNG.
+    image = pygame.transform.scale(pygame.image.load(path), size)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Written under a temporary name first, so that another copy of the game never reads half a file.
+        temporary_path = f'{cache_path}.{os.getpid()}.{threading.get_ident()}'
+        with open(temporary_path, 'wb') as cache_file:
+            cache_file.write(_CACHE_HEADER.pack(_CACHE_MAGIC, size[0], size[1], source.st_mtime_ns, source.st_size))
+            cache_file.write(pygame.image.tobytes(image, 'RGBA'))
+        os.replace(temporary_path, cache_path)
+    except OSError:
+        pass # A read-only install still works, it just decodes the PNGs every time.
+    return image
+
+
+def load_images(surface_size: (int, int), cell_size: (int, int)) -> {str: pygame.Surface}:
+    """Return every image, scaled for the given window and cell size, and not yet converted. See load_image()."""
+    return {name: load_image(name, image_size(name, surface_size, cell_size)) for name in IMAGE_FILES}
+
+
+def convert_images(images: {str: pygame.Surface}) -> {str: pygame.Surface}:
+    """Convert images to the display's pixel format, so that drawing them needs no conversion. Must run on the main thread,
+    after the display mode is set. The background is opaque; everything else keeps its transparency.
+    """
+    return {name: image.convert() if name == 'BG' else image.convert_alpha() for name, image in images.items()}
+
+
+def placeholder_images(surface_size: (int, int), cell_size: (int, int)) -> {str: pygame.Surface}:
+    """Return plain stand-ins for every image, which take no time to make: a flat background, a colored disc for every sticker
+    and empty overlays. They are already converted to the display's format.
+    """
+    images = {}
+    for name in IMAGE_FILES:
+        if name == 'BG':
+            image = pygame.Surface(surface_size).convert()
+            image.fill(_PLACEHOLDER_BACKGROUND)
+        else:
+            image = pygame.Surface(cell_size, pygame.SRCALPHA).convert_alpha()
+            image.fill((0, 0, 0, 0))
+            if name in _PLACEHOLDER_COLORS:
+                pygame.draw.ellipse(image, _PLACEHOLDER_COLORS[name], image.get_rect().inflate(-4, -4))
+        images[name] = image
+    return images
+
+
+class ImageLibrary:
+    """The decoded images at their original size, kept in memory once load_originals() has run, and the scaled and converted
+    copies made from them. Copies are made when they are first asked for, and only the cache_size most recently used sizes are kept:
+    the background keyed by window size and everything else keyed by cell size.
+    """
+
+    def __init__(self, cache_size: int = 4):
+        self._originals = None
+        self._cache_size = cache_size
+        self._backgrounds = OrderedDict() # Window size -> {'BG': image}.
+        self._cells = OrderedDict() # Cell size -> every other image.
+
+    def load_originals(self) -> None:
+        """Decode every PNG. This does not need the display, so it can run on any thread."""
+        self._originals = {name: pygame.image.load(os.path.join(ASSET_DIR, file_name)) for name, file_name in IMAGE_FILES.items()}
+
+    def has_originals(self) -> bool:
+        return self._originals is not None
+
+    def add(self, images: {str: pygame.Surface}, surface_size: (int, int), cell_size: (int, int)) -> None:
+        """Keep converted images that were made some other way, such as the ones loaded at startup, as if they had been scaled here."""
+        self._store(self._backgrounds, tuple(surface_size), {'BG': images['BG']})
+        self._store(self._cells, tuple(cell_size), {name: image for name, image in images.items() if name != 'BG'})
+
+    def images(self, surface_size: (int, int), cell_size: (int, int)) -> {str: pygame.Surface}:
+        """Return every image scaled for the window and cell size, and converted. Must run on the main thread, after load_originals()."""
+        background = self._backgrounds.get(tuple(surface_size))
+        if background is None:
+            background = {'BG': pygame.transform.scale(self._originals['BG'], surface_size).convert()}
+        self._store(self._backgrounds, tuple(surface_size), background)
+        cells = self._cells.get(tuple(cell_size))
+        if cells is None:
+            cells = {name: pygame.transform.scale(image, cell_size).convert_alpha() for name, image in self._originals.items() if name != 'BG'}
+        self._store(self._cells, tuple(cell_size), cells)
+        return dict(background, **cells)
+
+    def _store(self, cache: OrderedDict, key: (int, int), images: {str: pygame.Surface}) -> None:
+        """Put images in a cache as its most recently used entry, and drop the least recently used entries beyond cache_size."""
+        cache[key] = images
+        cache.move_to_end(key)
+        while len(cache) > self._cache_size:
+            cache.popitem(last=False)
+
+
+class SoundBank:
+    """The game's sounds and music. The mixer is only started by load(), and if it can not start, or a file is missing,
+    the affected sounds are silent instead of stopping the game.
+    """
+
+    def __init__(self):
+        self._sounds = {}
+        self._music_loaded = False
+
+    def load(self) -> None:
+        """Start the mixer and load every sound, then start the music. Can run on a background thread."""
+        try:
+            if not pygame.mixer.get_init():
+                pygame.mixer.init()
+        except pygame.error:
+            return # No audio device. The game stays silent.
+        sounds = {}
+        for name, (file_name, volume) in SOUND_FILES.items():
+            try:
+                sound = pygame.mixer.Sound(os.path.join(ASSET_DIR, file_name))
+            except (pygame.error, FileNotFoundError):
+                continue
+            sound.set_volume(volume)
+            sounds[name] = sound
+        self._sounds = sounds # Replaced in one step, so play() on the main thread never sees a half filled dictionary.
+        file_name, volume = MUSIC_FILE
+        try:
+            pygame.mixer.music.load(os.path.join(ASSET_DIR, file_name))
+        except (pygame.error, FileNotFoundError):
+            return
+        pygame.mixer.music.set_volume(volume)
+        pygame.mixer.music.play(-1) # The -1 argument causes the music to loop indefinitely.
+        self._music_loaded = True
+
+    def play(self, name: str) -> None:
+        """Play a sound, if it is loaded."""
+        sound = self._sounds.get(name)
+        if sound:
+            sound.play()
+
+    def stop_music(self) -> None:
+        if self._music_loaded:
+            pygame.mixer.music.stop()
+
+
+class AssetLoader:
+    """Loads the images for one window and cell size, then the sounds, and then the original images of the library, on a daemon thread.
+
+    ready() tells whether the images have been loaded. The sounds become audible on their own once they are loaded,
+    and the library can scale images for new sizes once it has its originals.
+    """
+
+    def __init__(self, surface_size: (int, int), cell_size: (int, int), sounds: SoundBank, library: ImageLibrary = None):
+        self.surface_size = surface_size
+        self.cell_size = cell_size
+        self._sounds = sounds
+        self._library = library
+        self._images = None
+        self._error = None
+        self._ready = threading.Event()
+        self._seconds = None
+        self._thread = threading.Thread(target=self._load, name='MaggieColumnsAssets', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def images(self) -> {str: pygame.Surface}:
+        """Return the loaded, unconverted images. Raises whatever error stopped them from loading."""
+        if self._error:
+            raise self._error
+        return self._images
+
+    def seconds(self) -> float:
+        """Return how long loading the images took, or None if they are not loaded yet."""
+        return self._seconds
+
+    def _load(self) -> None:
+        start = time.perf_counter()
+        try:
+            self._images = load_images(self.surface_size, self.cell_size)
+        except Exception as error: # Handed to the main thread by images(), where it is raised like a synchronous load would.
+            self._error = error
+        self._seconds = time.perf_counter() - start
+        self._ready.set()
+        self._sounds.load()
+        if self._library and not self._error:
+            self._library.load_originals()
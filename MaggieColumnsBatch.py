@@ -0,0 +1,223 @@
+# MaggieColumnsBatch
+# This module plays many seeded games of columns without graphics, spread over a pool of processes, and summarizes the results.
+#
+# Example: python MaggieColumnsBatch.py --games 10000 --policy random --format json --output stats.json
+
+import argparse
+import csv
+import json
+import multiprocessing
+import random
+import statistics
+import sys
+from collections import namedtuple
+
+import MaggieColumnsModel
+
+# The compact result of a single game, which is all that is sent back from a worker process.
+# chain_counts[depth] is the number of landings that set off a cascade of that depth. Depth 0 means the landing matched nothing.
+# pieces_spawned and donuts_spawned count the pieces of every faller that spawned, including the one that ended the game.
+# game_over_step is the number of actions taken before the game ended, or None if the game hit the step limit first.
+GameResult = namedtuple('GameResult', ['seed', 'score', 'pieces_placed', 'steps', 'chain_counts', 'pieces_spawned', 'donuts_spawned',
+                                       'donuts_matched', 'game_over_step'])
+
+
+class RandomPolicy:
+    """Pick a random action every step. Gravity ticks are weighted so that the faller still makes its way down the board."""
+
+    def __init__(self, seed: int, tick_weight: int = 3):
+        self._rng = random.Random(f'{seed}:policy')
+        self._actions = list(MaggieColumnsModel.ACTIONS) + [MaggieColumnsModel.TICK] * (tick_weight - 1)
+
+    def choose(self, game: MaggieColumnsModel.Game) -> str:
+        return self._rng.choice(self._actions)
+
+
+class ScriptedPolicy:
+    """Repeat a fixed sequence of actions for the whole game."""
+
+    def __init__(self, seed: int, script: [str]):
+        for action in script:
+            if action not in MaggieColumnsModel.ACTIONS:
+                raise ValueError(f'unknown action in script: {action!r}')
+        self._script = script
+        self._position = 0
+
+    def choose(self, game: MaggieColumnsModel.Game) -> str:
+        action = self._script[self._position]
+        self._position = (self._position + 1) % len(self._script)
+        return action
+
+
+POLICIES = {
+    'random': RandomPolicy,
+    'scripted': ScriptedPolicy,
+}
+
+
+def play_game(seed: int, policy_name: str = 'random', policy_options: dict = None, max_steps: int = 100000) -> GameResult:
+    """Play one game with the given seed and policy until it ends or max_steps actions have been taken, and return its GameResult."""
+    game = MaggieColumnsModel.Game(seed)
+    policy = POLICIES[policy_name](seed, **(policy_options or {}))
+    chain_counts = [0]
+    pieces_spawned = len(game.current_faller())
+    donuts_spawned = sum(1 for piece in game.current_faller() if piece.is_donut())
+    donuts_matched = 0
+    game_over_step = None
+    for step in range(1, max_steps + 1):
+        landed = False
+        chain = 0
+        for event in game.step(policy.choose(game)):
+            if event.kind == MaggieColumnsModel.EVENT_LANDED:
+                landed = True
+            elif event.kind == MaggieColumnsModel.EVENT_MATCHED:
+                chain = event.chain
+                donuts_matched += event.donuts
+            elif event.kind == MaggieColumnsModel.EVENT_SPAWNED:
+                pieces_spawned += len(game.current_faller())
+                donuts_spawned += sum(1 for piece in game.current_faller() if piece.is_donut())
+        if landed:
+            while len(chain_counts) <= chain:
+                chain_counts.append(0)
+            chain_counts[chain] += 1
+        if game.is_over():
+            game_over_step = step
+            break
+    return GameResult(seed, game.score(), game.pieces_placed(), step, tuple(chain_counts), pieces_spawned, donuts_spawned, donuts_matched,
+                      game_over_step)
+
+
+def _play_game_task(task: (int, str, dict, int)) -> GameResult:
+    """Unpack a task tuple for play_game. Pool.imap_unordered only passes a single argument to the worker."""
+    return play_game(*task)
+
+
+class Summary:
+    """Merges GameResults, in any order, into summary statistics."""
+
+    def __init__(self):
+        self._results = 0
+        self._scores = []
+        self._pieces_placed = []
+        self._game_over_steps = []
+        self._unfinished = 0
+        self._chain_counts = []
+        self._pieces_spawned = 0
+        self._donuts_spawned = 0
+        self._donuts_matched = 0
+
+    def add(self, result: GameResult) -> None:
+        self._results += 1
+        self._scores.append(result.score)
+        self._pieces_placed.append(result.pieces_placed)
+        if result.game_over_step is None:
+            self._unfinished += 1
+        else:
+            self._game_over_steps.append(result.game_over_step)
+        for depth, count in enumerate(result.chain_counts):
+            if depth == len(self._chain_counts):
+                self._chain_counts.append(0)
+            self._chain_counts[depth] += count
+        self._pieces_spawned += result.pieces_spawned
+        self._donuts_spawned += result.donuts_spawned
+        self._donuts_matched += result.donuts_matched
+
+    def as_dict(self) -> dict:
+        """Return the summary as a flat dictionary of numbers, ready to be written as JSON or as a CSV row."""
+        summary = {'games': self._results, 'unfinished_games': self._unfinished}
+        summary.update(_describe('score', self._scores))
+        summary.update(_describe('pieces_placed', self._pieces_placed))
+        summary.update(_describe('game_over_step', self._game_over_steps))
+        summary['pieces_spawned'] = self._pieces_spawned
+        summary['donuts_spawned'] = self._donuts_spawned
+        summary['donuts_matched'] = self._donuts_matched
+        summary['donut_rate'] = self._donuts_spawned / self._pieces_spawned if self._pieces_spawned else 0.0
+        summary['max_chain'] = len(self._chain_counts) - 1
+        for depth, count in enumerate(self._chain_counts):
+            summary[f'chains_{depth}'] = count
+        return summary
+
+
+def _describe(name: str, values: [int]) -> dict:
+    """Return the mean, standard deviation, minimum, median and maximum of a list of values, with keys prefixed by name."""
+    if not values:
+        return {f'{name}_{stat}': None for stat in ('mean', 'stdev', 'min', 'median', 'max')}
+    return {
+        f'{name}_mean': statistics.fmean(values),
+        f'{name}_stdev': statistics.pstdev(values),
+        f'{name}_min': min(values),
+        f'{name}_median': statistics.median(values),
+        f'{name}_max': max(values),
+    }
+
+
+def run_batch(games: int, first_seed: int = 0, policy_name: str = 'random', policy_options: dict = None,
+              max_steps: int = 100000, workers: int = None, on_result=None) -> Summary:
+    """Play games with seeds first_seed, first_seed + 1, ... across a pool of worker processes and return their merged Summary.
+
+    Results are streamed back as each game finishes. If on_result is given, it is called with every GameResult as it arrives.
+    workers defaults to the number of CPU cores.
+    """
+    tasks = ((seed, policy_name, policy_options, max_steps) for seed in range(first_seed, first_seed + games))
+    summary = Summary()
+    workers = workers or multiprocessing.cpu_count()
+    # Send games to the workers in chunks, so that the overhead of talking to the pool is small compared to playing the games.
+    chunksize = max(1, min(256, games // (workers * 8)))
+    with multiprocessing.Pool(workers) as pool:
+        for result in pool.imap_unordered(_play_game_task, tasks, chunksize):
+            summary.add(result)
+            if on_result:
+                on_result(result)
+    return summary
+
+
+def _write_summary(summary: dict, output, output_format: str) -> None:
+    if output_format == 'json':
+        json.dump(summary, output, indent=2)
+        output.write('\n')
+    else:
+        writer = csv.DictWriter(output, fieldnames=list(summary))
+        writer.writeheader()
+        writer.writerow(summary)
+
+
+def main(argv: [str] = None) -> None:
+    parser = argparse.ArgumentParser(description='Play many seeded games of MaggieColumns without graphics and summarize the results.')
+    parser.add_argument('-n', '--games', type=int, default=1000, help='number of games to play')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game; each following game uses the next seed')
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='random', help='how actions are chosen')
+    parser.add_argument('--script', default='tick', help='comma separated actions repeated by the scripted policy, e.g. left,rotate,drop')
+    parser.add_argument('--tick-weight', type=int, default=3, help='how many times more likely a tick is than any other action, for the random policy')
+    parser.add_argument('--max-steps', type=int, default=100000, help='actions after which an unfinished game is stopped')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='number of worker processes (default: one per core)')
+    parser.add_argument('--format', choices=('json', 'csv'), default='json', help='format of the summary')
+    parser.add_argument('-o', '--output', default=None, help='file to write the summary to (default: standard output)')
+    parser.add_argument('--games-csv', default=None, help='also write one CSV row per game to this file')
+    args = parser.parse_args(argv)
+
+    if args.policy == 'scripted':
+        policy_options = {'script': [action.strip() for action in args.script.split(',')]}
+    else:
+        policy_options = {'tick_weight': args.tick_weight}
+
+    games_file = open(args.games_csv, 'w', newline='') if args.games_csv else None
+    try:
+        on_result = None
+        if games_file:
+            games_writer = csv.writer(games_file)
+            games_writer.writerow(GameResult._fields)
+            on_result = lambda result: games_writer.writerow(result._replace(chain_counts=' '.join(map(str, result.chain_counts))))
+        summary = run_batch(args.games, args.seed, args.policy, policy_options, args.max_steps, args.workers, on_result)
+    finally:
+        if games_file:
+            games_file.close()
+
+    if args.output:
+        with open(args.output, 'w', newline='') as output:
+            _write_summary(summary.as_dict(), output, args.format)
+    else:
+        _write_summary(summary.as_dict(), sys.stdout, args.format)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+# MaggieColumnsBenchmark
+# This module times the hot paths of the model on seeded board states, and compares the times against a stored baseline.
+#
+# Save a baseline:            python MaggieColumnsBenchmark.py --save
+# Compare against the baseline: python MaggieColumnsBenchmark.py
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+import MaggieColumnsModel
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+# Each board state is described by the range of column heights it is filled to (in visible rows), the chance of each piece being a donut,
+# and the shape of the board (see Board.shape()), where an empty dictionary means the default shape.
+BOARD_STATES = {
+    'empty': ((0, 0), 0.05, {}),
+    'half_full': ((5, 8), 0.05, {}),
+    'near_top': ((10, 12), 0.05, {}),
+    'donut_heavy': ((5, 8), 0.35, {}),
+    'huge': ((96, 160), 0.05, {'columns': 64, 'rows': 256}), # A stress test of how the model scales.
+}
+
+
+def make_board(state: str, seed: int) -> MaggieColumnsModel.Board:
+    """Return a board filled with frozen pieces according to BOARD_STATES[state]. The same state and seed always give the same board.
+
+    The pieces are random, so the board usually contains matches that have not been found yet.
+    """
+    (lowest, highest), donut_rate, shape = BOARD_STATES[state]
+    rng = random.Random(f'{state}:{seed}')
+    board = MaggieColumnsModel.Board(**shape)
+    for col in range(board.columns()):
+        height = rng.randint(lowest, highest)
+        for row in range(board.rows() - height, board.rows()):
+            jewel = MaggieColumnsModel.DONUT if rng.random() < donut_rate else rng.randint(1, 7)
+            board.set_cell(col, row, MaggieColumnsModel.encode_cell(jewel, MaggieColumnsModel.FROZEN))
+    return board
+
+
+def make_faller(board: MaggieColumnsModel.Board, seed: int) -> MaggieColumnsModel.Faller:
+    """Insert a seeded faller into the board, and let it fall until all of it is visible, or until it lands."""
+    rng = random.Random(seed)
+    faller = MaggieColumnsModel.Faller(rng, board.faller_length())
+    faller.insert(board, rng.randint(0, board.columns() - 1))
+    for fall in range(board.faller_length()):
+        if faller.landed:
+            break
+        faller.fall()
+    return faller
+
+
+# Every benchmark is a pair of functions. prepare(board, seed) builds the object that is timed, starting from a fresh copy of a state,
+# and is not timed. run(prepared) performs the operation once.
+def _prepare_board(board, seed):
+    return board
+
+def _prepare_matched(board, seed):
+    board.find_matches(full_scan=True)
+    return board
+
+def _prepare_deleted(board, seed):
+    board.find_matches(full_scan=True)
+    board.delete_matched_pieces()
+    return board
+
+def _prepare_faller(board, seed):
+    return make_faller(board, seed)
+
+def _find_matches(board):
+    board.find_matches(full_scan=True)
+
+def _delete_matched_pieces(board):
+    board.delete_matched_pieces()
+
+def _apply_gravity(board):
+    board.apply_gravity()
+
+def _fall(faller):
+    try:
+        faller.fall()
+    except MaggieColumnsModel.GameOverError:
+        pass
+
+def _move(faller):
+    faller.move(faller.column_num - 1 if faller.column_num else faller.column_num + 1)
+
+def _rotate(faller):
+    faller.rotate()
+
+def _cascade(board):
+    board.resolve_cascade()
+
+
+BENCHMARKS = {
+    'find_matches': (_prepare_board, _find_matches),
+    'delete_matched_pieces': (_prepare_matched, _delete_matched_pieces),
+    'apply_gravity': (_prepare_deleted, _apply_gravity),
+    'faller_fall': (_prepare_faller, _fall),
+    'faller_move': (_prepare_faller, _move),
+    'faller_rotate': (_prepare_faller, _rotate),
+    'cascade': (_prepare_board, _cascade),
+}
+
+
+def time_benchmark(name: str, state: str, number: int = 500, repeat: int = 5) -> float:
+    """Return the fastest time, in microseconds, of one call to the named benchmark on the given board state.
+
+    Every repeat prepares number fresh objects from seeded boards, and then times calling the operation once on each of them.
+    Taking the fastest repeat filters out noise from the rest of the system.
+    """
+    prepare, run = BENCHMARKS[name]
+    boards = [make_board(state, seed) for seed in range(number)]
+    best = None
+    for attempt in range(repeat):
+        prepared = [prepare(board.clone(), seed) for seed, board in enumerate(boards)]
+        gc.disable() # Like timeit, keep garbage collection from landing in the middle of a measurement.
+        try:
+            start = time.perf_counter()
+            for item in prepared:
+                run(item)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best / number * 1e6
+
+
+def run_all(number: int = 500, repeat: int = 5, name_filter: str = '') -> {str: float}:
+    """Time every benchmark on every board state, and return the times keyed by 'benchmark/state'."""
+    results = {}
+    for name in BENCHMARKS:
+        for state in BOARD_STATES:
+            key = f'{name}/{state}'
+            if name_filter in key:
+                results[key] = time_benchmark(name, state, number, repeat)
+    return results
+
+
+def load_baseline(path: str) -> {str: float}:
+    with open(path) as baseline_file:
+        return json.load(baseline_file)['results']
+
+
+def save_baseline(path: str, results: {str: float}) -> None:
+    baseline = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'results': results,
+    }
+    with open(path, 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write('\n')
+
+
+def compare(results: {str: float}, baseline: {str: float}, threshold: float) -> [str]:
+    """Print each result next to its baseline, and return the keys that got slower than the baseline by more than threshold (0.1 is 10%)."""
+    regressions = []
+    print(f'{"benchmark":40} {"us/call":>10} {"baseline":>10} {"change":>8}')
+    for key, current in results.items():
+        if key in baseline:
+            change = current / baseline[key] - 1
+            flag = ''
+            if change > threshold:
+                flag = '  REGRESSION'
+                regressions.append(key)
+            elif change < -threshold:
+                flag = '  faster'
+            print(f'{key:40} {current:10.2f} {baseline[key]:10.2f} {change:+8.1%}{flag}')
+        else:
+            print(f'{key:40} {current:10.2f} {"-":>10} {"new":>8}')
+    return regressions
+
+
+def main(argv: [str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Time the MaggieColumns model on seeded board states and compare against a baseline.')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='baseline file to compare against or save to')
+    parser.add_argument('--save', action='store_true', help='save the results as the new baseline instead of comparing')
+    parser.add_argument('--threshold', type=float, default=0.10, help='slowdown, as a fraction, that counts as a regression')
+    parser.add_argument('--number', type=int, default=500, help='boards timed in each repeat')
+    parser.add_argument('--repeat', type=int, default=5, help='repeats of each benchmark; the fastest is kept')
+    parser.add_argument('--filter', default='', help='only run benchmarks whose benchmark/state name contains this text')
+    args = parser.parse_args(argv)
+
+    results = run_all(args.number, args.repeat, args.filter)
+    if args.save:
+        save_baseline(args.baseline, results)
+        for key, current in results.items():
+            print(f'{key:40} {current:10.2f}')
+        print(f'Saved baseline to {args.baseline}')
+        return 0
+    if not os.path.exists(args.baseline):
+        compare(results, {}, args.threshold)
+        print(f'No baseline at {args.baseline}. Run with --save to create one.')
+        return 0
+    regressions = compare(results, load_baseline(args.baseline), args.threshold)
+    if regressions:
+        print(f'{len(regressions)} regression(s) beyond {args.threshold:.0%}: {", ".join(regressions)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,248 @@
+# MaggieColumnsDataset
+# This module plays games with the computer player and streams every decision it makes to a file of fixed-size records,
+# for training and evaluating placement policies. Later runs append to the same file, and files are read through mmap,
+# so slices of millions of records can be used without copying them, and without ever building Piece objects for them.
+#
+# Example: python MaggieColumnsDataset.py --games 1000 --output decisions.mgd
+
+import argparse
+import mmap
+import multiprocessing
+import os
+import struct
+import time
+from collections import namedtuple
+from typing import Iterator
+
+import MaggieColumnsAI
+import MaggieColumnsModel
+
+# File layout, all little-endian:
+#   header:  magic, format version (B), the shape of the board: columns (H), visible rows (H), hidden rows (B), faller length (B),
+#            match length (B), and the size of one record (I)
+#   records: one per decision, laid out as record_struct() describes, with nothing between them
+MAGIC = b'MGDS'
+VERSION = 1
+_HEADER = struct.Struct('<4sBHHBBBI')
+
+# One decision of the computer player. board is Board.to_bytes() of the board before the decision, without the current faller in it.
+# current and next are the jewels of the current and next faller, top to bottom. column and rotations are where the player put the
+# current faller, and score_delta, chain and score are what happened when it got there: the points it scored, the depth of the
+# cascade it set off (0 if nothing matched) and the score of the game afterwards.
+Decision = namedtuple('Decision', ['seed', 'turn', 'board', 'current', 'next', 'column', 'rotations', 'score_delta', 'chain', 'score'])
+
+
+def _field_codes(shape: dict) -> [str]:
+    """Return the struct code of every field of a record, in the order of Decision."""
+    cells = shape['columns'] * (shape['rows'] + shape['hidden_rows'])
+    faller = f'{shape["faller_length"]}s'
+    return ['Q', 'I', f'{cells}s', faller, faller, 'H', 'B', 'I', 'B', 'I']
+
+
+def record_struct(shape: dict) -> struct.Struct:
+    """Return the struct of one record for boards of the given shape (see Board.shape())."""
+    return struct.Struct('<' + ''.join(_field_codes(shape)))
+
+
+def record_fields(shape: dict) -> [(str, int, int)]:
+    """Return the (name, offset, size) of every field of a record, e.g. to build a numpy dtype for the records of a Dataset."""
+    fields = []
+    offset = 0
+    for name, code in zip(Decision._fields, _field_codes(shape)):
+        size = struct.calcsize('<' + code)
+        fields.append((name, offset, size))
+        offset += size
+    return fields
+
+
+class DatasetWriter:
+    """Appends records to a dataset file, creating it if it does not exist yet.
+
+    An existing file must hold boards of the same shape. A partial record left at its end by a run that was stopped mid-write is cut off.
+    Records are collected in memory and written buffer_records at a time. Use the writer as a context manager, or call close().
+    """
+
+    def __init__(self, path: str, shape: dict = None, buffer_records: int = 4096):
+        self.shape = shape if shape else MaggieColumnsModel.Board().shape()
+        self._struct = record_struct(self.shape)
+        self._buffer = bytearray()
+        self._buffer_size = buffer_records * self._struct.size
+        header = _HEADER.pack(MAGIC, VERSION, self.shape['columns'], self.shape['rows'], self.shape['hidden_rows'],
+                              self.shape['faller_length'], self.shape['match_length'], self._struct.size)
+        if os.path.exists(path) and os.path.getsize(path):
+            self._file = open(path, 'r+b')
+            if self._file.read(_HEADER.size) != header:
+                self._file.close()
+                raise ValueError(f'{path} is not a dataset of boards with the shape {self.shape}')
+            records = (os.path.getsize(path) - _HEADER.size) // self._struct.size
+            self._file.truncate(_HEADER.size + records * self._struct.size)
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self._file = open(path, 'wb')
+            self._file.write(header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def write(self, decision: Decision) -> None:
+        self.write_records(self._struct.pack(*decision))
+
+    def write_records(self, data: bytes) -> None:
+        """Append records that are already packed with record_struct(), such as the ones play_records() returns."""
+        if len(data) % self._struct.size:
+            raise ValueError(f'{len(data)} bytes is not a whole number of {self._struct.size} byte records')
+        self._buffer += data
+        if len(self._buffer) >= self._buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        self._file.write(self._buffer)
+        self._buffer.clear()
+        self._file.flush()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+class Dataset:
+    """A dataset file, mapped into memory read-only. Records are decoded one at a time by indexing, and view() gives the raw
+    bytes of any slice of records without copying them.
+
+    Views must be released before close() is called, because a memory map can not be closed while views of it exist.
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as dataset_file:
+            magic, version, columns, rows, hidden_rows, faller_length, match_length, record_size = _HEADER.unpack(dataset_file.read(_HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f'{path} is not a MaggieColumns dataset, or a dataset from another version')
+            self.shape = {'columns': columns, 'rows': rows, 'hidden_rows': hidden_rows, 'faller_length': faller_length, 'match_length': match_length}
+            self._struct = record_struct(self.shape)
+            if self._struct.size != record_size:
+                raise ValueError(f'{path} has records of {record_size} bytes, expected {self._struct.size}')
+            # The file always holds at least the header, so it is never too short to map.
+            self._mmap = mmap.mmap(dataset_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._length = (len(self._mmap) - _HEADER.size) // record_size # A partial record at the end, from a write in progress, is left out.
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index: int) -> Decision:
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('dataset index out of range')
+        return Decision(*self._struct.unpack_from(self._mmap, _HEADER.size + index * self._struct.size))
+
+    def record_size(self) -> int:
+        return self._struct.size
+
+    def view(self, start: int = 0, stop: int = None) -> memoryview:
+        """Return the bytes of records start to stop (exclusive) as a memoryview of the mapped file, without copying them.
+        The fields of each record are at the offsets given by record_fields(dataset.shape).
+        """
+        start, stop, step = slice(start, stop).indices(self._length)
+        size = self._struct.size
+        return memoryview(self._mmap)[_HEADER.size + start * size:_HEADER.size + max(start, stop) * size]
+
+    def board(self, index: int) -> MaggieColumnsModel.Board:
+        """Return the board of a record as a Board, for replaying decisions through the model."""
+        return MaggieColumnsModel.Board.from_bytes(self[index].board, **self.shape)
+
+    def close(self) -> None:
+        self._mmap.close()
+
+
+def play_decisions(player: MaggieColumnsAI.AutoPlayer, seed: int, shape: dict = None, max_fallers: int = 1000) -> Iterator[Decision]:
+    """Play a headless game with the player, like MaggieColumnsAI.play(), and yield a Decision for every faller it placed."""
+    game = MaggieColumnsModel.Game(seed, MaggieColumnsModel.Board(**shape) if shape else None)
+    turn = 0
+    while not game.is_over() and game.pieces_placed() < max_fallers:
+        faller, next_faller = game.current_faller(), game.next_faller()
+        board = game.board().clone()
+        for col, row in faller.cells():
+            board.set_cell(col, row, MaggieColumnsModel.EMPTY)
+        placement = player.choose(game.board(), faller, next_faller)
+        current = bytes(piece.jewel() for piece in faller)
+        score_delta = 0
+        chain = 0
+        for action in player.actions(faller, placement):
+            for event in game.step(action):
+                if event.kind == MaggieColumnsModel.EVENT_MATCHED:
+                    score_delta += event.score_delta
+                    chain = event.chain
+        yield Decision(seed, turn, board.to_bytes(), current, bytes(piece.jewel() for piece in next_faller),
+                       placement.column, placement.rotations, score_delta, chain, game.score())
+        turn += 1
+
+
+def play_records(seed: int, shape: dict = None, player_options: dict = None, max_fallers: int = 1000) -> bytes:
+    """Play one game with a new AutoPlayer made from player_options, and return its decisions packed as records.
+    This is what the worker processes of generate() run, so only one bytes object per game goes back to the main process.
+    """
+    pack = record_struct(shape if shape else MaggieColumnsModel.Board().shape()).pack
+    player = MaggieColumnsAI.AutoPlayer(**(player_options or {}))
+    return b''.join(pack(*decision) for decision in play_decisions(player, seed, shape, max_fallers))
+
+
+def _play_records_task(task: (int, dict, dict, int)) -> bytes:
+    """Unpack a task tuple for play_records. Pool.imap only passes a single argument to the worker."""
+    return play_records(*task)
+
+
+def generate(path: str, games: int, first_seed: int = 0, shape: dict = None, player_options: dict = None,
+             max_fallers: int = 1000, workers: int = None) -> int:
+    """Play games with seeds first_seed, first_seed + 1, ... across a pool of worker processes, append their decisions to the
+    dataset at path in the order of the seeds, and return the number of records added. workers defaults to the number of CPU cores.
+    """
+    shape = shape if shape else MaggieColumnsModel.Board().shape()
+    tasks = ((seed, shape, player_options, max_fallers) for seed in range(first_seed, first_seed + games))
+    record_size = record_struct(shape).size
+    added = 0
+    workers = workers or multiprocessing.cpu_count()
+    with DatasetWriter(path, shape) as writer, multiprocessing.Pool(workers) as pool:
+        for data in pool.imap(_play_records_task, tasks):
+            writer.write_records(data)
+            added += len(data) // record_size
+    return added
+
+
+def main(argv: [str] = None) -> None:
+    parser = argparse.ArgumentParser(description='Record the decisions of the MaggieColumns computer player as fixed-size records.')
+    parser.add_argument('-o', '--output', required=True, help='dataset file; records are appended if it already exists')
+    parser.add_argument('-n', '--games', type=int, default=100, help='number of games to play')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game; each following game uses the next seed')
+    parser.add_argument('--beam', type=int, default=0, help='placements of the current faller to search the next faller after (0 turns lookahead off)')
+    parser.add_argument('--budget', type=float, default=0.05, help='seconds allowed for each decision')
+    parser.add_argument('--max-fallers', type=int, default=1000, help='fallers after which a game is stopped')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='number of worker processes (default: one per core)')
+    parser.add_argument('--columns', type=int, default=MaggieColumnsModel.NUMBER_OF_COLUMNS)
+    parser.add_argument('--rows', type=int, default=MaggieColumnsModel.NUMBER_OF_ROWS, help='visible rows')
+    parser.add_argument('--faller-length', type=int, default=MaggieColumnsModel.FALLER_LENGTH)
+    parser.add_argument('--match-length', type=int, default=MaggieColumnsModel.MATCH_LENGTH)
+    args = parser.parse_args(argv)
+
+    shape = MaggieColumnsModel.Board(args.columns, args.rows, faller_length=args.faller_length, match_length=args.match_length).shape()
+    start = time.perf_counter()
+    added = generate(args.output, args.games, args.seed, shape, {'beam_width': args.beam, 'time_budget': args.budget},
+                     args.max_fallers, args.workers)
+    with Dataset(args.output) as dataset:
+        total = len(dataset)
+    print(f'{added} records added in {time.perf_counter() - start:.2f}s, {total} records in {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -3,9 +3,14 @@
 # This module implements the rules of the game of columns.
 
 import random
+from array import array
+from collections import namedtuple
 
-NUMBER_OF_ROWS = 13
+# The default shape of a board. Each Board can be given its own shape instead.
+NUMBER_OF_ROWS = 13 # Visible rows.
 NUMBER_OF_COLUMNS = 6
+FALLER_LENGTH = 3 # Pieces in a faller. The board has this many hidden rows above the visible ones, unless it is given more.
+MATCH_LENGTH = 3 # Pieces in a row, column or diagonal that make a match.
 MAGGIE_JEWELS = {
     1: 'H', # Happy Maggie. Smiling Sticker.
     2: 'S', # Sad Maggie. Pouting Sticker
@@ -16,6 +21,80 @@ MAGGIE_JEWELS = {
     7: 'B', # Blown up Maggie. 
     8: 'O'  # Golden Special Donut.
 }
+DONUT = 8
+# Distributions of the jewels of new pieces, for PieceSequence: each jewel's share of a total weight of at most 256.
+# The standard one is exactly the 5% donuts and evenly split 95% of Piece._pick_jewel(): 7 and 7 * 19 parts of 140.
+STANDARD_DISTRIBUTION = {1: 19, 2: 19, 3: 19, 4: 19, 5: 19, 6: 19, 7: 19, DONUT: 7}
+NO_DONUT_DISTRIBUTION = {1: 1, 2: 1, 3: 1, 4: 1, 5: 1, 6: 1, 7: 1}
+
+# The board stores every cell as one small integer: the jewel number in the low 4 bits, and the state of the piece in the next 2 bits.
+# An empty cell is 0, since no jewel has the number 0.
+EMPTY = 0
+FALLING = 0
+LANDED = 1
+FROZEN = 2
+MATCHED = 3
+_STATE_MARKS = {FALLING: '[]', LANDED: '||', FROZEN: '  ', MATCHED: '**'}
+
+
+def encode_cell(jewel: int, state: int) -> int:
+    """Pack a jewel number and a piece state into a single cell value."""
+    return jewel | (state << 4)
+
+def cell_jewel(cell: int) -> int:
+    """Return the jewel number stored in a cell value. 0 means the cell is empty."""
+    return cell & 0x0F
+
+def cell_state(cell: int) -> int:
+    """Return the state (FALLING, LANDED, FROZEN or MATCHED) stored in a cell value."""
+    return cell >> 4
+
+def cell_sticker(cell: int) -> str:
+    """Return the text sticker of a cell value, in the same format as Piece.sticker(). Empty cells are returned as '   '."""
+    if cell == EMPTY:
+        return '   '
+    marks = _STATE_MARKS[cell_state(cell)]
+    return f'{marks[0]}{MAGGIE_JEWELS[cell_jewel(cell)]}{marks[1]}'
+
+
+_LINE_TABLES = {} # Cache of line tables, keyed by board shape. See _line_table().
+_JEWEL_BITS = bytes(value & 0x0F for value in range(256)) # For bytes.translate(), which keeps only the jewel number of every cell.
+
+
+def _line_table(columns: int, rows: int, hidden_rows: int, match_length: int) -> ([range], [[int]]):
+    """Return every column, row and diagonal of the visible part of a board as a range of flat cell indices,
+    along with a list that gives, for every flat cell index, the positions in the first list of the lines passing through that cell.
+
+    Indices are in the same column-major layout as Board uses, so every line is evenly spaced in the array: a column has a step of 1,
+    a row a step of rows, and the diagonals steps of rows + 1 (going down to the right) and rows - 1 (going up to the right).
+    Lines shorter than match_length cells can never hold a match, so they are left out.
+    The table only depends on the shape of the board, so it is built once per shape and cached.
+    """
+    shape = (columns, rows, hidden_rows, match_length)
+    if shape not in _LINE_TABLES:
+        visible = range(hidden_rows, rows)
+        lines = []
+        # Columns, then rows.
+        for col in range(columns):
+            lines.append(range(col * rows + hidden_rows, (col + 1) * rows))
+        for row in visible:
+            lines.append(range(row, columns * rows, rows))
+        # Diagonals going down-right start on the left edge or the top visible row.
+        for col, row in [(0, row) for row in visible] + [(col, hidden_rows) for col in range(1, columns)]:
+            length = min(columns - col, rows - row)
+            lines.append(range(col * rows + row, col * rows + row + length * (rows + 1), rows + 1))
+        # Diagonals going up-right start on the left edge or the bottom row.
+        for col, row in [(0, row) for row in visible] + [(col, rows - 1) for col in range(1, columns)]:
+            length = min(columns - col, row - hidden_rows + 1)
+            lines.append(range(col * rows + row, col * rows + row + length * (rows - 1), rows - 1))
+        lines = [line for line in lines if len(line) >= match_length]
+        lines_through_cell = [[] for index in range(columns * rows)]
+        for line_number, line in enumerate(lines):
+            for index in line:
+                lines_through_cell[index].append(line_number)
+        _LINE_TABLES[shape] = (lines, lines_through_cell)
+    return _LINE_TABLES[shape]
+
 
 class GameOverError(Exception):
     pass
@@ -31,100 +110,237 @@ class Piece:
     Matched: Surrounded with '**'. Sparkles in the graphical implementation.
 
     Jewels are created using numerical values and each have one of seven unique colors/pictures representing them. (Different stickers of Maggie)
+    A piece only stores its jewel number and its state as two small integers, the same ones that the board packs into a cell.
+    The text sticker is built only when it is asked for. Pieces are still separate objects, so a faller can tell its pieces apart.
+    A random.Random instance can be passed in to pick the jewel from a seeded generator instead of the global one,
+    or the jewel can be given, as PieceSequence does.
     """
+    __slots__ = ('_jewel', '_state')
 
-    def __init__(self):
-        self._pick_sticker()
-        # These 4 bool values represent the states of the piece.
-        self._falling = True
-        self._landed = False
-        self._frozen = False
-        self._matched = False
+    def __init__(self, rng: random.Random = None, jewel: int = None):
+        self._jewel = jewel if jewel else self._pick_jewel(rng if rng else random)
+        self._state = FALLING
     
     def __str__(self):
-        return self._sticker
+        return self.sticker()
     
     def id(self) -> str:
         """Return the identifying icon of this piece, without anything denoting its current state."""
-        return self._sticker[1]
+        return MAGGIE_JEWELS[self._jewel]
 
     def sticker(self) -> str:
         """Return the icon and whatever surrounds it that denotes its current state."""
-        return self._sticker
+        return cell_sticker(self.cell())
     
     def is_donut(self) -> bool:
-        return True if self.sticker()[1] == 'O' else False
+        return self._jewel == DONUT
     
     def is_falling(self) -> bool:
         """Return True if the piece is falling."""
-        return True if self._falling else False
+        return self._state == FALLING
 
     def is_landed(self) -> bool:
         """Return True if the piece is landed."""
-        return True if self._landed else False
+        return self._state == LANDED
     
     def is_matched(self) -> bool:
         """Return True if the piece is matched."""
-        return True if self._matched else False
+        return self._state == MATCHED
+
+    def jewel(self) -> int:
+        """Return the number of this piece's jewel, as used in MAGGIE_JEWELS."""
+        return self._jewel
+
+    def state(self) -> int:
+        """Return the current state of the piece as FALLING, LANDED, FROZEN or MATCHED."""
+        return self._state
+
+    def cell(self) -> int:
+        """Return the packed cell value that represents this piece on the board."""
+        return self._jewel | (self._state << 4)
     
     # Methods for changing the state of the piece.
-    # [1:-1] slicing is to access the 'middle' of the piece, which is the letter that designates its color.
     def land(self):
-        """Update bool values and sticker to indicate that the piece has landed."""
-        self._falling = False
-        self._landed = True
-        self._sticker = f'|{self._sticker[1:-1]}|'
+        """Update the state to indicate that the piece has landed."""
+        self._state = LANDED
     
     def unland(self):
-        """Update bool values and sticker to indicate that the piece has been 'un-landed'."""
-        self._landed = False
-        self._falling = True
-        self._sticker = f'[{self._sticker[1:-1]}]'
+        """Update the state to indicate that the piece has been 'un-landed'."""
+        self._state = FALLING
     
     def freeze(self):
-        """Update bool values and sticker to indicate that the piece has frozen in place."""
-        self._landed = False
-        self._frozen = True
-        self._sticker = f' {self._sticker[1:-1]} '
+        """Update the state to indicate that the piece has frozen in place."""
+        self._state = FROZEN
     
     def match(self):
-        """Update bool values and sticker to indicate that the piece has been matched to adjacent pieces."""
-        self._frozen = False
-        self._matched = True
-        self._sticker = f'*{self._sticker[1:-1]}*'
+        """Update the state to indicate that the piece has been matched to adjacent pieces."""
+        self._state = MATCHED
 
-    def _pick_sticker(self) -> None:
+    def _pick_jewel(self, rng) -> int:
         """Randomly select an integer to use as a key to the MAGGIE_JEWELS dictionary to pick a sticker for the piece.
         Each of the standard pieces has an equal chance of being picked. The special donut has a 5% chance to appear.
         The special donut matches with all pieces.
         """
-        if random.random() <= 0.05: # 5% chance of getting a special donut.
-            self._sticker = f'[{MAGGIE_JEWELS[8]}]'
+        if rng.random() <= 0.05: # 5% chance of getting a special donut.
+            return DONUT
         else: # The other 95% is evenly split between the 7 standard pieces.
-            random_number = random.randint(1, 7)
-            self._sticker = f'[{MAGGIE_JEWELS[random_number]}]'
-        
+            return rng.randint(1, 7)
+
+
+class _DrawStream:
+    """Values drawn from a seeded generator a block at a time, and handed out in order.
+
+    new_rng() returns the generator as it is at the start of the stream, and draw_block(rng, size) draws at least size values' worth
+    of random bytes and returns the values. The last block_size values handed out are kept, so going back that far with seek() is
+    immediate. Going back further draws the stream again from the start.
+    """
+
+    def __init__(self, new_rng, draw_block, block_size: int):
+        self._new_rng = new_rng
+        self._draw_block = draw_block
+        self._block_size = block_size
+        self._restart()
+
+    def _restart(self) -> None:
+        self._rng = self._new_rng()
+        self._values = self._draw_block(self._rng, 0) # No values yet, in whatever type the blocks come in.
+        self._start = 0 # The position in the stream of _values[0].
+        self._position = 0 # The index in _values of the next value.
+
+    def take(self, count: int):
+        """Return the next count values."""
+        while len(self._values) - self._position < count:
+            # Twice the shortfall is nearly always enough for one draw, since the tables of PieceSequence drop less than half the bytes.
+            block = self._draw_block(self._rng, max(self._block_size, 2 * (count - len(self._values) + self._position)))
+            dropped = max(0, self._position - self._block_size)
+            self._values = self._values[dropped:] + block
+            self._start += dropped
+            self._position -= dropped
+        self._position += count
+        return self._values[self._position - count:self._position]
+
+    def tell(self) -> int:
+        """Return the number of values handed out so far."""
+        return self._start + self._position
+
+    def seek(self, position: int) -> None:
+        """Go to the point in the stream after position values have been handed out."""
+        if position < self._start:
+            self._restart()
+        if position <= self._start + len(self._values):
+            self._position = position - self._start
+        else:
+            self.take(position - self.tell())
+
+
+class PieceSequence:
+    """The jewels of the pieces and the spawn columns of the fallers of one game, from generators seeded with seed.
+
+    Jewels and columns are drawn block_size at a time: one getrandbits() call gives a random byte per draw, and bytes.translate() turns
+    the bytes into jewels or column indices through a table built from the distribution. The table repeats the distribution as
+    many times as it fits into the 256 byte values, and the few bytes past the last repetition are dropped, so the draws follow
+    the distribution exactly and more than half of every block is used. Blocks are only drawn when the previous one runs out, and the jewels and columns
+    are the same whatever the block_size, and however many jewels are asked for at a time.
+    Jewels and columns have generators of their own, so the jewels do not depend on the shape of the board.
+    state() is how far into both the sequence is, as two integers, and set_state() goes back (or forward) to such a point.
+
+    distribution maps jewels to integer weights, see STANDARD_DISTRIBUTION. spawn_columns lists the columns that fallers spawn in,
+    each as likely as the others, and defaults to every column of a board with columns columns.
+    """
+
+    def __init__(self, seed: int = None, columns: int = NUMBER_OF_COLUMNS, distribution: {int: int} = None, spawn_columns: [int] = None,
+                 block_size: int = 4096):
+        distribution = distribution if distribution else STANDARD_DISTRIBUTION
+        if any(jewel not in MAGGIE_JEWELS or weight < 0 for jewel, weight in distribution.items()) or not 0 < sum(distribution.values()) <= 256:
+            raise ValueError('a distribution needs jewels from MAGGIE_JEWELS, with weights that add up to between 1 and 256')
+        self._spawn_columns = list(spawn_columns) if spawn_columns is not None else list(range(columns))
+        if not self._spawn_columns:
+            raise ValueError('a faller needs at least one column to spawn in')
+        # A seed is picked if none is given, since going back to an earlier state may need the generators to start over.
+        self._seed = seed if seed is not None else random.randrange(2 ** 64)
+        self._column_seed = random.Random(self._seed).getrandbits(64)
+        # Byte -> jewel, with 0 for the bytes past the largest multiple of the total weight, which no jewel uses.
+        # The standard distribution only fits once, so its table, and the jewels of every recording, are what they always were.
+        weights = b''.join(bytes([jewel]) * weight for jewel, weight in distribution.items())
+        self._jewel_table = weights * (256 // len(weights)) + bytes(256 % len(weights))
+        # Byte -> index in spawn_columns, with 255 for the bytes past the largest multiple of the number of spawn columns.
+        # With more spawn columns than that, columns are drawn one at a time.
+        count = len(self._spawn_columns)
+        self._column_table = bytes(index % count if index < 256 - 256 % count else 255 for index in range(256)) if count < 255 else None
+        self._jewels = _DrawStream(self._new_jewel_rng, self._draw_jewels, block_size)
+        self._columns = _DrawStream(lambda: random.Random(self._column_seed), self._draw_columns, block_size)
+
+    def jewels(self, count: int) -> bytes:
+        """Return the next count jewels."""
+        return self._jewels.take(count)
+
+    def faller(self, length: int = FALLER_LENGTH) -> 'Faller':
+        """Return a new faller of length pieces, with the next jewels."""
+        return Faller(length=length, jewels=self.jewels(length))
+
+    def spawn_column(self) -> int:
+        """Return the column that the next faller spawns in."""
+        return self._spawn_columns[self._columns.take(1)[0]]
+
+    def state(self) -> (int, int):
+        """Return the number of jewels and of spawn columns handed out so far."""
+        return (self._jewels.tell(), self._columns.tell())
+
+    def set_state(self, state: (int, int)) -> None:
+        """Continue the sequence from a state returned by state()."""
+        self._jewels.seek(state[0])
+        self._columns.seek(state[1])
+
+    def _new_jewel_rng(self) -> random.Random:
+        rng = random.Random(self._seed)
+        rng.getrandbits(64) # The first 64 bits are the seed of the column generator.
+        return rng
+
+    def _draw_jewels(self, rng: random.Random, size: int) -> bytes:
+        return self._random_bytes(rng, size).translate(self._jewel_table).replace(b'\x00', b'')
+
+    def _draw_columns(self, rng: random.Random, size: int):
+        if self._column_table is None:
+            return [rng.randrange(len(self._spawn_columns)) for draw in range(size)]
+        return self._random_bytes(rng, size).translate(self._column_table).replace(b'\xff', b'')
+
+    @staticmethod
+    def _random_bytes(rng: random.Random, size: int) -> bytes:
+        # getrandbits() fills 32 bits at a time, lowest first, so whole numbers of 4 bytes continue one stream of bytes
+        # however they are split into calls.
+        if size <= 0: # getrandbits(0) is an error before Python 3.9, and _DrawStream asks for nothing to get an empty block.
+            return b''
+        size = -(-size // 4) * 4
+        return rng.getrandbits(8 * size).to_bytes(size, 'little')
+
 
 class Faller:
     """This is the part of the MaggieColumns game that the player has control over.
     
     Upon initialization, the faller chooses its component pieces, and assigns a top, middle, and bottom piece. 
     After being initialized, it needs to be inserted with the insert() method, which takes a game board and a column number.
+    Once inserted, the faller keeps track of its own column and bottom row, so it never has to search the board to find itself,
+    and it checks its moves against the size of the board it was inserted into.
+    The optional rng is passed on to the pieces, so that a seeded random.Random produces the same fallers every time.
+    Alternatively, the jewels of the pieces can be given, from top to bottom, as PieceSequence.faller() does.
+    length is the number of pieces, which should be the faller_length() of the board the faller is going to be inserted into.
     """
 
-    def __init__(self):
-        self._faller = self._assign_pieces()
-        # Designate a top, bottom, and middle piece. For the purpose of rotating them.
-        self._split_into_parts()
-        # Designate the column that the faller currently resides in.
+    def __init__(self, rng: random.Random = None, length: int = FALLER_LENGTH, jewels: bytes = None):
+        # The pieces, from top to bottom.
+        self._faller = [Piece(jewel=jewel) for jewel in jewels] if jewels is not None else self._assign_pieces(rng, length)
     
     def __getitem__(self, index):
         return self._faller[index]
+
+    def __len__(self):
+        return len(self._faller)
     
-    def insert(self, game_board: [[int]], column_num: int):
-        self.column_num = self._check_initial_column(game_board, column_num)
-        self._current_column = game_board[self.column_num]
+    def insert(self, game_board: 'Board', column_num: int):
         self._game_board = game_board
+        self.column_num = self._check_initial_column(game_board, column_num)
+        # The row of the bottom piece of the faller.
+        self._bottom_index = len(self._faller) - 1
         # Insert the faller into the column.
         self._insert_faller()
         # These 3 bool values represent the state of the faller.
@@ -133,6 +349,10 @@ class Faller:
         self.frozen = False
         # This bool is true if the faller is completely visible on the board.
         self._on_board = False
+        # If the column is already full up to the hidden rows, the faller has landed as soon as it is inserted.
+        if not self._space_available():
+            self._land_faller()
+            self._replace_faller(self._bottom_index)
     
     def fall(self):
         """Causes the faller to fall.
@@ -148,9 +368,9 @@ class Faller:
 
         The fall method will raise a game over error if a faller freezes before being fully visible.
         """
-        bottom_index = self._find_bottom_index()
-        # If the bottom index is 5, it means that all 3 pieces of the faller are visible on the board. Index 5 means the 6th row, or the third visible row.
-        if bottom_index == 5:
+        bottom_index = self._bottom_index
+        # If the top piece is below the hidden rows, all the pieces of the faller are visible on the board. With 3 hidden rows and 3 pieces, that is a bottom index of 5, the third visible row.
+        if bottom_index - len(self._faller) + 1 >= self._game_board.hidden_rows():
             self._on_board = True
         # If the faller is already landed, and this method is called, there is special behavior.
         if self.landed:
@@ -167,15 +387,14 @@ class Faller:
         elif self._space_available():
             if self._faller_is_landing():
                 self._land_faller()
-            self._current_column[bottom_index - 1:bottom_index + 2] = self._faller # Lower the faller.
-            self._current_column[bottom_index - 2] = 0 # Changes the space above the faller back to 0.
+            self._bottom_index = bottom_index + 1
+            self._replace_faller(self._bottom_index) # Lower the faller.
+            self._game_board.set_cell(self.column_num, bottom_index + 1 - len(self._faller), EMPTY) # Changes the space above the faller back to empty.
     
     def rotate(self) -> None:
-        """Rotate the faller. That is, cycle the pieces of the faller so that the bottom is on top, top goes to middle, middle goes to bottom."""
-        bottom_index = self._find_bottom_index()
-        self._top_piece, self._middle_piece, self._bottom_piece = self._bottom_piece, self._top_piece, self._middle_piece
-        self._faller = [self._top_piece, self._middle_piece, self._bottom_piece]
-        self._replace_faller(bottom_index)
+        """Rotate the faller. That is, cycle the pieces of the faller so that the bottom is on top, and every other piece moves down one."""
+        self._faller = self._faller[-1:] + self._faller[:-1]
+        self._replace_faller(self._bottom_index)
 
     def move(self, new_column_num: int) -> None:
         """Move the faller to a new column.
@@ -185,18 +404,16 @@ class Faller:
         """
         # First, the move is checked to ensure the faller is not attempting to move outside the board.
         if self._is_valid_move(new_column_num): 
-            # The new column is assigned via indexing the game board.
-            new_column = self._game_board[new_column_num]
             # If there is space to move the faller, proceed.
-            if self._check_new_column(new_column):
-                bottom_index = self._find_bottom_index()
+            if self._check_new_column(new_column_num):
+                bottom_index = self._bottom_index
+                old_column_num = self.column_num
                 # Copy the contents of the faller to the next column.
-                new_column[bottom_index - 2:bottom_index + 1] = self._faller
-                # Set the old faller space to zero.
-                self._current_column[bottom_index - 2: bottom_index + 1] = [0, 0, 0]
-                # Update the relevant attributes.
-                self._current_column = self._game_board[new_column_num]
                 self.column_num = new_column_num
+                self._replace_faller(bottom_index)
+                # Set the old faller space to empty.
+                for row in range(bottom_index + 1 - len(self._faller), bottom_index + 1):
+                    self._game_board.set_cell(old_column_num, row, EMPTY)
                 # Refresh the state of the faller in case it needs to be unlanded.
                 self._refresh_faller_state()
             else:
@@ -204,68 +421,71 @@ class Faller:
         else:
             return
 
+    def cells(self) -> ((int, int),):
+        """Return the (col, row) coordinates of the pieces of the faller, from top to bottom."""
+        return tuple((self.column_num, row) for row in range(self._bottom_index + 1 - len(self._faller), self._bottom_index + 1))
+
     # Methods used by the faller to be aware of its surroundings.
-    def _check_initial_column(self, board: [[int]], column_num: int) -> int:
+    def _check_initial_column(self, board: 'Board', column_num: int) -> int:
         """Make sure the space this faller is spawned into is not occupied by another faller.
         
         If it is, change the column number to be something else before the faller is created.
         Return a valid column number.
         """
-        if board[column_num][0:3] != [0, 0, 0]: # If the first 3 cells (the hidden ones) in the column are not empty.
-            column_num = (column_num + 1) % 6 # Keeps column_num between 0 and 5
+        if any(board.cell(column_num, row) != EMPTY for row in range(len(self._faller))): # If the cells at the top of the column, where the faller goes, are not empty.
+            column_num = (column_num + 1) % board.columns() # Keeps column_num on the board.
         return column_num
     
     def _faller_is_landing(self) -> bool:
-        bottom_index = self._find_bottom_index()
-        if bottom_index == 14:
+        bottom_index = self._bottom_index
+        if bottom_index == self._game_board.rows() - 2: # The faller is about to fall onto the bottom row.
             return True
-        elif self._current_column[bottom_index + 2] != 0:
+        elif self._game_board.cell(self.column_num, bottom_index + 2) != EMPTY:
             return True
         else:
             return False
 
     def _space_available(self) -> bool:
         """Return true if there is space below the faller. Otherwise, return false."""
-        bottom_index = self._find_bottom_index()
-        if self._current_column[bottom_index + 1] == 0:
+        bottom_index = self._bottom_index
+        if bottom_index + 1 < self._game_board.rows() and self._game_board.cell(self.column_num, bottom_index + 1) == EMPTY:
             return True
         else:
             return False
     
-    def _check_new_column(self, new_column: list) -> bool:
+    def _check_new_column(self, new_column_num: int) -> bool:
         """Return true if there is space in a new column."""
-        if new_column[self._find_bottom_index()] == 0:
+        if self._game_board.cell(new_column_num, self._bottom_index) == EMPTY:
             return True
         else:
             return False
     
     def _is_valid_move(self, new_column_num: int) -> bool:
         """Return True if the faller is not on the edge of the board. Otherwise return False."""
-        if 0 <= new_column_num <= 5:
+        if 0 <= new_column_num < self._game_board.columns():
             return True
         else:
             return False
 
     # Methods for changing state of faller.
     def _replace_faller(self, bottom_index) -> None:
-        """Re-place the faller inside the column."""
-        self._current_column[bottom_index - 2:bottom_index + 1] = self._faller
+        """Re-place the faller inside the column, writing the current cell value of each piece."""
+        top_index = bottom_index + 1 - len(self._faller)
+        for offset, piece in enumerate(self._faller):
+            self._game_board.set_cell(self.column_num, top_index + offset, piece.cell())
     
     def _refresh_faller_state(self) -> None:
         """Refresh the state of the faller in case it has moved above open space."""
         if self.landed:
-            try:
-                if self._space_available():
-                    # If there is space below the faller, unland the faller and replace it in the column to make sure it displays properly.
-                    self._unland_faller()
-                    self._replace_faller(self._find_bottom_index())
-            except IndexError: # If there is an index error, it means that the faller was on the bottom of the board, and should stay landed.
-                return
+            if self._space_available():
+                # If there is space below the faller, unland the faller and replace it in the column to make sure it displays properly.
+                self._unland_faller()
+                self._replace_faller(self._bottom_index)
         else:
             if not self._space_available():
                 # If there isn't space available, it means the faller was moved above a taken space, and needs to be landed again.
                 self._land_faller()
-                self._replace_faller(self._find_bottom_index())
+                self._replace_faller(self._bottom_index)
 
     def _land_faller(self) -> None:
         self._falling = False
@@ -285,169 +505,433 @@ class Faller:
         for jewel in self._faller:
             jewel.freeze()
 
-    # Utility method. 
-    def _find_bottom_index(self) -> int:
-        return self._current_column.index(self._faller[2])
-    
     # Private methods used during initialization. 
     def _insert_faller(self) -> None:
-        """Insert the faller into the first 3 parts of the column."""
-        self._current_column[0:3] = self._faller
+        """Insert the faller into the top cells of the column."""
+        self._replace_faller(self._bottom_index)
 
-    def _assign_pieces(self) -> list:
-        """Create 3 pieces and append them to a list and return that list."""
+    def _assign_pieces(self, rng: random.Random, length: int) -> list:
+        """Create length pieces and append them to a list and return that list."""
         faller = []
-        for piece in range(3):
-            faller.append(Piece())
+        for piece in range(length):
+            faller.append(Piece(rng))
         return faller
-    
-    def _split_into_parts(self) -> None:
-        """Create an attribute for each of the pieces of the faller; top, middle, and bottom."""
-        self._top_piece = self._faller[0]
-        self._middle_piece = self._faller[1]
-        self._bottom_piece = self._faller[2]
+
+
+# One round of a cascade, as returned by Board.resolve_cascade(). cells is a sorted tuple of the (col, row) coordinates of the pieces
+# that matched, and moves a tuple of the (col, from_row, to_row) triples of the pieces that gravity moved after they were deleted.
+# chain counts from 1 for the first round, and donuts is the number of matched cells that held a donut.
+CascadeStep = namedtuple('CascadeStep', ['cells', 'moves', 'score_delta', 'chain', 'donuts'])
 
 
 class Board:
     """The main game board for the game of columns.
 
-    This object represents a 2D list of integers.
-    Each column contains 13 + 3 zeros to accomodate a faller of size 3.
+    The board is stored as one contiguous array of bytes, one byte per cell, laid out column by column.
+    Each cell holds a packed value (see encode_cell): the jewel number and the state of the piece, or EMPTY.
+    Each column contains rows visible cells, with hidden_rows more above them to accomodate a faller of faller_length pieces.
+    By default that is 13 + 3 cells, for a faller of size 3. A match takes match_length pieces in a line.
 
-    The additional 3 spaces are where the faller is placed upon creation. The faller is invisible to the
+    The additional hidden spaces are where the faller is placed upon creation. The faller is invisible to the
     player in this state, but becomes visible when it has fallen once. If any part of the faller is
-    still in these extra 3 spaces and the faller freezes, the game will end.
+    still in these extra spaces and the faller freezes, the game will end.
 
     The board has the ability to detect matches between pieces, delete the matched pieces, and make floating pieces fall.
+    Cells should be read and written through cell(), jewel(), state() and set_cell() rather than by touching the array.
     """
-    def __init__(self):
+    def __init__(self, columns: int = NUMBER_OF_COLUMNS, rows: int = NUMBER_OF_ROWS, hidden_rows: int = None,
+                 faller_length: int = FALLER_LENGTH, match_length: int = MATCH_LENGTH):
+        if hidden_rows is None:
+            hidden_rows = faller_length
+        if columns < 1 or rows < 1 or faller_length < 1 or match_length < 2:
+            raise ValueError('a board needs at least 1 column, 1 row and a faller of 1 piece, and a match needs at least 2 pieces')
+        if hidden_rows < faller_length:
+            raise ValueError(f'{hidden_rows} hidden rows can not hold a faller of {faller_length} pieces')
+        self._columns = columns
+        self._rows = rows + hidden_rows # The hidden rows, where the faller will be initialized, are added above the visible ones.
+        self._hidden_rows = hidden_rows
+        self._faller_length = faller_length
+        self._match_length = match_length
         self._board = self._generate_new_board()
-        self._matched_pieces = []
+        self._matched_cells = set()
+        self._dirty_cells = set() # Flat indices of cells written since the last search for matches.
+        self._gapped_columns = {} # Column -> lowest row that has had a piece deleted since gravity was last applied.
         self._score = 0
     
     def score(self):
         return self._score
 
     def board(self) -> [[int]]:
-        """Return the 2D list that this object represents."""
-        return self._board
+        """Return a 2D list of the cell values on the board, one list per column. The list is a copy; writing to it does not change the board."""
+        return [self._board[col * self._rows:(col + 1) * self._rows].tolist() for col in range(self._columns)]
+
+    def columns(self) -> int:
+        """Return the number of columns on the board."""
+        return self._columns
+
+    def rows(self) -> int:
+        """Return the number of rows in each column, including the hidden rows."""
+        return self._rows
+
+    def visible_rows(self) -> int:
+        """Return the number of rows in each column that the player can see."""
+        return self._rows - self._hidden_rows
+
+    def hidden_rows(self) -> int:
+        """Return the number of rows at the top of each column that are hidden from the player."""
+        return self._hidden_rows
+
+    def faller_length(self) -> int:
+        """Return the number of pieces in the fallers that are played on this board."""
+        return self._faller_length
+
+    def match_length(self) -> int:
+        """Return the number of pieces in a line that make a match."""
+        return self._match_length
+
+    def shape(self) -> dict:
+        """Return the arguments that create an empty board of the same shape as this one: Board(**board.shape())."""
+        return {'columns': self._columns, 'rows': self.visible_rows(), 'hidden_rows': self._hidden_rows,
+                'faller_length': self._faller_length, 'match_length': self._match_length}
+
+    # Accessors for individual cells.
+    def cell(self, col: int, row: int) -> int:
+        """Return the packed value of the cell at (col, row)."""
+        return self._board[col * self._rows + row]
+
+    def set_cell(self, col: int, row: int, cell: int) -> None:
+        """Write a packed value into the cell at (col, row), and mark the cell as dirty so the next search for matches looks at it."""
+        index = col * self._rows + row
+        self._board[index] = cell
+        self._dirty_cells.add(index)
+
+    def dirty_cells(self) -> {(int, int)}:
+        """Return the set of (col, row) coordinates that have been written since the last search for matches."""
+        return {divmod(index, self._rows) for index in self._dirty_cells}
+
+    def clear_dirty_cells(self) -> None:
+        """Forget which cells were written, for a board that is known to hold no matches, such as one that a CascadeStep was
+        replayed onto after resolve_cascade() ran on a copy of it. Otherwise the next search would look at those cells again.
+        """
+        self._dirty_cells = set()
+
+    def jewel(self, col: int, row: int) -> int:
+        """Return the jewel number at (col, row), or 0 if the cell is empty."""
+        return self._board[col * self._rows + row] & 0x0F
+
+    def state(self, col: int, row: int) -> int:
+        """Return the state of the piece at (col, row)."""
+        return self._board[col * self._rows + row] >> 4
+
+    # Copying and serialization.
+    def clone(self) -> 'Board':
+        """Return an independent copy of this board, including its score."""
+        new_board = Board.__new__(Board)
+        new_board._columns = self._columns
+        new_board._rows = self._rows
+        new_board._hidden_rows = self._hidden_rows
+        new_board._faller_length = self._faller_length
+        new_board._match_length = self._match_length
+        new_board._board = array('B', self._board)
+        new_board._matched_cells = set(self._matched_cells)
+        new_board._dirty_cells = set(self._dirty_cells)
+        new_board._gapped_columns = dict(self._gapped_columns)
+        new_board._score = self._score
+        return new_board
+
+    def to_bytes(self) -> bytes:
+        """Return the cells of the board as bytes, column by column."""
+        return self._board.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, score: int = 0, **shape) -> 'Board':
+        """Create a board from bytes produced by to_bytes(). A board that is not the default shape needs its shape() passed as well."""
+        new_board = cls(**shape)
+        if len(data) != len(new_board._board):
+            raise ValueError(f'expected {len(new_board._board)} bytes, got {len(data)}')
+        new_board._board = array('B', data)
+        new_board._dirty_cells = set(range(len(data))) # Nothing is known about the new cells, so all of them need to be searched.
+        new_board._gapped_columns = dict.fromkeys(range(new_board._columns), new_board._rows - 1) # And any column might have floating pieces.
+        new_board._score = score
+        return new_board
     
-    def find_matches(self) -> None:
-        """Detect pieces that are matched on the board. Then make any 'floating' pieces fall to fill in the gaps."""
-        # Search the board in all directions.
-        self._search_all_directions()
-        return True if self._matched_pieces else False
+    def find_matches(self, full_scan: bool = False) -> bool:
+        """Detect pieces that are matched on the board and put them in the matched state. Return true if any matches were found.
+
+        Only the lines passing through dirty cells are searched, since a new match has to include a cell that changed since the last search.
+        Cells that were emptied can not be part of a match, so they are skipped. Pass full_scan=True to search every line on the board instead.
+        """
+        lines, lines_through_cell = _line_table(self._columns, self._rows, self._hidden_rows, self._match_length)
+        if not full_scan:
+            line_numbers = set()
+            for index in self._dirty_cells:
+                if self._board[index] != EMPTY:
+                    line_numbers.update(lines_through_cell[index])
+            lines = [lines[line_number] for line_number in line_numbers]
+        self._dirty_cells = set()
+        for index in self._search_lines(lines, self._match_length):
+            col, row = divmod(index, self._rows)
+            self._board[index] = encode_cell(self._board[index] & 0x0F, MATCHED)
+            self._matched_cells.add((col, row))
+        return True if self._matched_cells else False
+
+    def matched_cells(self) -> {(int, int)}:
+        """Return the set of (col, row) coordinates of the pieces that are currently matched."""
+        return set(self._matched_cells)
     
     def delete_matched_pieces(self) -> bool:
         """Delete all pieces that are currently in the matched state. Return true if pieces were deleted."""
-        if self._matched_pieces: # Only attempt to delete matches if matches exist.
-            for matched_piece, col, row in self._matched_pieces:
-                self._board[col][row] = 0 # Set to 0 to indicate erasure of the matched piece.
-                self._score += 10 if not matched_piece.is_donut() else 100
-            self._matched_pieces = []
+        if self._matched_cells: # Only attempt to delete matches if matches exist.
+            gapped_columns = self._gapped_columns
+            for col, row in self._matched_cells:
+                self._score += 10 if self.jewel(col, row) != DONUT else 100
+                self.set_cell(col, row, EMPTY) # Set to EMPTY to indicate erasure of the matched piece.
+                if gapped_columns.get(col, -1) < row:
+                    gapped_columns[col] = row
+            self._matched_cells = set()
             return True
         else:
             return False
     
-    def apply_gravity(self) -> None:
-        """Make any floating pieces fall."""
-        floating_pieces = self._search_for_floaters()
-        while floating_pieces: # Repeatedly search for new falling pieces, and make those pieces fall.
-            self._make_pieces_fall(floating_pieces)
-            floating_pieces = self._search_for_floaters()
+    def apply_gravity(self, columns: [int] = None) -> [(int, int, int)]:
+        """Make any floating pieces fall, and return a list of (col, from_row, to_row) triples describing every piece that moved.
+
+        Each column is compacted in a single pass from the bottom up, so a gap of any height is closed at once.
+        By default only the columns that have had pieces deleted since the last call are compacted, starting from their lowest deleted piece,
+        since nothing below it can move. Pass a list of column numbers to compact whole columns of your choice instead.
+        The hidden rows are left alone.
+        """
+        if columns is None:
+            starts = sorted(self._gapped_columns.items())
+        else:
+            starts = [(col, self._rows - 1) for col in columns]
+        board, rows, hidden_rows = self._board, self._rows, self._hidden_rows
+        dirty_cells = self._dirty_cells
+        moves = []
+        for col, start_row in starts:
+            base = col * rows
+            bottom_row = start_row # The lowest empty row that the next piece up will fall into.
+            for row in range(start_row, hidden_rows - 1, -1):
+                cell = board[base + row]
+                if cell != EMPTY:
+                    if row != bottom_row:
+                        board[base + bottom_row] = cell
+                        board[base + row] = EMPTY
+                        dirty_cells.add(base + bottom_row)
+                        dirty_cells.add(base + row)
+                        moves.append((col, row, bottom_row))
+                    bottom_row -= 1
+        self._gapped_columns = {}
+        return moves
     
-    def _search_all_directions(self) -> None:
-        """Search up, down, left, right, and diagonally for matches."""
-        for col in range(NUMBER_OF_COLUMNS):
-            for row in range(3, NUMBER_OF_ROWS + 3):
-                cell = self._board[col][row]
-                # if (cell, col, row) in self._matched_pieces: 
-                #     continue # If a piece was already found to be matched, then we don't need to search for it again. Skip.
-                if cell != 0:
-                    self._search_direction_for_matches(col, row, 0, -1)  # Up
-                    self._search_direction_for_matches(col, row, 0, 1)   # Down
-                    self._search_direction_for_matches(col, row, -1, 0)  # Left
-                    self._search_direction_for_matches(col, row, 1, 0)   # Right
-                    self._search_direction_for_matches(col, row, -1, -1) # Diagonal Up Left
-                    self._search_direction_for_matches(col, row, 1, -1)  # Diagonal Up Right  
-                    self._search_direction_for_matches(col, row, -1, 1)  # Diagonal Down Left
-                    self._search_direction_for_matches(col, row, 1, 1)   # Diagonal Down Right     
-
-    def _search_direction_for_matches(self, col: int, row: int, col_delta: int, row_delta:int) -> None:
-        """Using a starting location for a piece, given in coordinates (col, row), find all matches in a single direction.
-
-        col_delta and row_delta should be -1, 0, or 1 to indicate left, no, or rightward motion.
-        
-        col_delta = 1 indicates rightward searching. -1 means leftward.
-        row_delta = -1 indicates upward searching.    1 means downward.
-        A combination of both can be used to search for matches diagonally.
+    def resolve_cascade(self) -> [CascadeStep]:
+        """Find matches, delete them and apply gravity, over and over until nothing matches any more, and return a CascadeStep for every round.
+
+        The board is left in its final state. The steps hold everything needed to show the chain afterwards, see mark_matched() and move_pieces().
         """
-        search_location = self._board[col][row] # Starting point for the search. We will look in one directin starting from here. This is a Piece object.
-        # These two lists keep track of the pieces that this function searches through. One or the other will be blank, depending on if the first piece is a donut or not.
-        found_pieces =       [(search_location, col, row)] if search_location.sticker() != ' O ' else [] # Pieces found that have the same sticker. Col/row included to find for deletion.
-        donuts_encountered = [(search_location, col, row)] if search_location.sticker() == ' O ' else [] # To keep track of donuts that are encountered.
-        while True:
-            # Shift the search to the next column and row.
-            col += col_delta
-            row += row_delta 
-
-            # Test to make sure the column and row indexes are within the bounds of the board. Subtract 1 because indexing starts at 0. 
-            if not (0 <= col <= NUMBER_OF_COLUMNS - 1) or not (0 <= row <= (NUMBER_OF_ROWS + 3) - 1): # NUMBER_OF_ROWS + 3 to account for top 3 rows.
-                break
-
-            search_location = self._board[col][row] # Index board to acquire new search location. This will either be a Piece object or an integer 0.
-            
-            if search_location == 0: # Stop searching if a blank cell is encountered.
-                break
-            elif search_location.is_donut(): # If the search location is a donut, add it to the list of dounts.
-                donuts_encountered.append((search_location, col, row))
-            elif found_pieces and search_location.id() == found_pieces[-1][0].id(): # If there was a previous piece it matches the current piece, add the current piece.
-                found_pieces.append((search_location, col, row))
-            elif not found_pieces: # Otherwise, add the current piece. This branch happens if the first piece was a golden donut and found_pieces is therefore empty.
-                found_pieces.append((search_location, col, row))
-            else:
-                break
-                
-        found_pieces += donuts_encountered # Combine the donuts with the standard pieces.
+        steps = []
+        while self.find_matches():
+            cells = tuple(sorted(self._matched_cells))
+            donuts = sum(1 for col, row in cells if self.jewel(col, row) == DONUT)
+            score_before = self._score
+            self.delete_matched_pieces()
+            moves = tuple(self.apply_gravity())
+            steps.append(CascadeStep(cells, moves, self._score - score_before, len(steps) + 1, donuts))
+        return steps
+
+    # Methods that replay a CascadeStep on a copy of the board as it was before resolve_cascade(), without searching it again:
+    # mark_matched(step.cells), then delete_matched_pieces(), then move_pieces(step.moves).
+    def mark_matched(self, cells: ((int, int),)) -> None:
+        """Put the pieces at the given (col, row) coordinates in the matched state, as find_matches() would have."""
+        for col, row in cells:
+            self._board[col * self._rows + row] = encode_cell(self.jewel(col, row), MATCHED)
+            self._matched_cells.add((col, row))
+
+    def move_pieces(self, moves: ((int, int, int),)) -> None:
+        """Move pieces as described by (col, from_row, to_row) triples, in order, as apply_gravity() would have."""
+        for col, from_row, to_row in moves:
+            self.set_cell(col, to_row, self.cell(col, from_row))
+            self.set_cell(col, from_row, EMPTY)
+        self._gapped_columns = {}
+
+    def _search_lines(self, lines: [range], match_length: int) -> {int}:
+        """Return the flat indices of every cell that is part of a run of match_length or more along any of the given lines.
+
+        A run is a stretch of occupied cells whose standard jewels are all the same. Donuts match with every jewel,
+        so a donut between two different jewels belongs to the run on both sides of it, and a run of only donuts also matches.
+        The jewels of each line are sliced out of a copy of the board that holds only jewel numbers, and split at the blank cells.
+        A run can only lie inside one of the stretches of occupied cells, so only stretches of at least match_length are walked cell by cell,
+        which keeps the empty parts of large boards almost free.
+        """
+        board_jewels = self._board.tobytes().translate(_JEWEL_BITS)
+        matched = set()
+        for line in lines:
+            stretch_start = 0 # Position in the line where the current stretch of occupied cells begins.
+            for stretch in board_jewels[line.start:line.stop:line.step].split(b'\x00'):
+                stretch_end = stretch_start + len(stretch)
+                if stretch_end - stretch_start >= match_length:
+                    run_start = stretch_start # Position in the line where the current run begins.
+                    run_jewel = EMPTY # The standard jewel of the current run. EMPTY while the run has only had donuts.
+                    donut_start = None # Position where the donuts at the end of the current run begin, if it ends with donuts.
+                    position = stretch_start
+                    for jewel in stretch:
+                        if jewel == DONUT:
+                            if donut_start is None:
+                                donut_start = position
+                        elif jewel != run_jewel:
+                            if run_jewel != EMPTY: # A different jewel ends the run, but the donuts before it carry over to the next run.
+                                if position - run_start >= match_length:
+                                    matched.update(line[run_start:position])
+                                run_start = donut_start if donut_start is not None else position
+                            run_jewel, donut_start = jewel, None
+                        else:
+                            donut_start = None
+                        position += 1
+                    if stretch_end - run_start >= match_length: # The end of the stretch, a blank cell or the edge of the board, ends the run.
+                        matched.update(line[run_start:stretch_end])
+                stretch_start = stretch_end + 1 # Past the blank cell that ended the stretch.
+        return matched
+
+    def _generate_new_board(self) -> array:
+        """Create a new game board, with every cell empty."""
+        return array('B', bytes(self._columns * self._rows))
+
+
+# Actions accepted by Game.step().
+LEFT = 'left'
+RIGHT = 'right'
+ROTATE = 'rotate'
+DOWN = 'down' # The player pushing the faller down by one cell.
+DROP = 'drop' # The faller falls until it freezes.
+TICK = 'tick' # One step of gravity.
+ACTIONS = (LEFT, RIGHT, ROTATE, DOWN, DROP, TICK)
+
+# Kinds of events returned by Game.step().
+EVENT_SPAWNED = 'spawned'
+EVENT_LANDED = 'landed'
+EVENT_MATCHED = 'matched'
+EVENT_GAME_OVER = 'game over'
+
+# cells is a tuple of (col, row) coordinates. score_delta, chain and donuts are only used by matched events;
+# chain counts from 1 for the first match after a landing, and donuts is the number of matched cells that held a donut.
+GameEvent = namedtuple('GameEvent', ['kind', 'cells', 'score_delta', 'chain', 'donuts'], defaults=((), 0, 0, 0))
+
+
+# The state of a game when its current faller has just spawned, which is all it takes to go back to that point.
+# grid is Board.to_bytes() without the current faller in it, current and next are the jewels of the current and next faller,
+# top to bottom, column is the column of the current faller, and sequence_state is PieceSequence.state().
+Snapshot = namedtuple('Snapshot', ['grid', 'score', 'current', 'column', 'next', 'sequence_state', 'pieces_placed'])
+
+
+def take_snapshot(board: Board, current_faller: Faller, next_faller: Faller, sequence: PieceSequence, pieces_placed: int) -> Snapshot:
+    """Return a Snapshot of a game whose current faller was just inserted into the board."""
+    grid = bytearray(board.to_bytes())
+    for col, row in current_faller.cells():
+        grid[col * board.rows() + row] = EMPTY
+    return Snapshot(bytes(grid), board.score(), bytes(piece.jewel() for piece in current_faller), current_faller.column_num,
+                    bytes(piece.jewel() for piece in next_faller), sequence.state(), pieces_placed)
+
+
+def restore_snapshot(snapshot: Snapshot, sequence: PieceSequence, shape: dict = None) -> (Board, Faller, Faller):
+    """Return a new board of the given shape (see Board.shape()) with the current faller inserted where it spawned, and the next
+    faller, as they were when the snapshot was taken. The sequence continues from where it was then as well.
+    """
+    board = Board.from_bytes(snapshot.grid, snapshot.score, **(shape or {}))
+    current_faller = Faller(jewels=snapshot.current)
+    current_faller.insert(board, snapshot.column)
+    sequence.set_state(snapshot.sequence_state)
+    return board, current_faller, Faller(jewels=snapshot.next)
+
+
+class Game:
+    """A complete game of columns that is driven by actions instead of a clock and a window.
+
+    The game owns its board, the current and next faller, and a PieceSequence created from the seed, so two games
+    with the same seed that receive the same actions always play out the same way. A PieceSequence can also be given, to play
+    with another distribution of jewels or other spawn columns.
+    Every call to step() applies one action and returns the list of GameEvents that it caused. After a landing, all matches
+    and the gravity that follows them are resolved before step() returns, and the next faller is inserted.
+    The game is played on an empty board of the default shape, unless it is given an empty board of another shape.
+    """
 
-        # After searching in that direction, if 3 or more pieces were found, then we match them.
-        if len(found_pieces) >= 3:
-            for piece, col, row in found_pieces:
-                piece.match()
-                self._matched_pieces.append((piece, col, row)) # Add the piece and its col/row to the list of matched pieces.
+    def __init__(self, seed: int = None, board: Board = None, sequence: PieceSequence = None):
+        self._board = board if board is not None else Board()
+        self._sequence = sequence if sequence is not None else PieceSequence(seed, self._board.columns())
+        self._current_faller = None
+        self._next_faller = self._sequence.faller(self._board.faller_length())
+        self._over = False
+        self._pieces_placed = 0
+        self._spawn_faller()
 
-    
-    def _search_for_floaters(self) -> [(Piece, int, int)]:
-        """Return a list of triples representing every floating piece in the board."""
-        floating_pieces = []
-        for col in range(NUMBER_OF_COLUMNS):
-            for row in range(3, NUMBER_OF_ROWS + 3): # exclude the top 3 hidden rows
-                cell = self._board[col][row]
-                if cell != 0 and self._space_below(cell, col, row): # If the cell is not empty and there is space underneath.
-                    floating_pieces.append((cell, col, row))
-        return floating_pieces
-    
-    def _make_pieces_fall(self, floating_pieces: [(Piece, int, int)]) -> None:
-        """Make all floating pieces fall one cell."""
-        for piece, col, row in floating_pieces:
-            self._board[col][row] = 0
-            self._board[col][row + 1] = piece
-
-    def _space_below(self, cell, col, row) -> bool:
-        """Return True if the cell beneath a piece is empty."""
+    def board(self) -> Board:
+        return self._board
+
+    def score(self) -> int:
+        return self._board.score()
+
+    def current_faller(self) -> Faller:
+        return self._current_faller
+
+    def next_faller(self) -> Faller:
+        return self._next_faller
+
+    def is_over(self) -> bool:
+        """Return True if the game has ended."""
+        return self._over
+
+    def pieces_placed(self) -> int:
+        """Return the number of fallers that have frozen on the board."""
+        return self._pieces_placed
+
+    def snapshot(self) -> Snapshot:
+        """Return a Snapshot of the game. Taken after the current faller has moved, it records the faller at the top of the column it is in."""
+        return take_snapshot(self._board, self._current_faller, self._next_faller, self._sequence, self._pieces_placed)
+
+    def restore(self, snapshot: Snapshot) -> None:
+        """Go back (or forward) to the point where a snapshot of this game was taken, even if the game has ended since."""
+        self._board, self._current_faller, self._next_faller = restore_snapshot(snapshot, self._sequence, self._board.shape())
+        self._pieces_placed = snapshot.pieces_placed
+        self._over = False
+
+    def step(self, action: str) -> [GameEvent]:
+        """Apply one of the actions in ACTIONS to the current faller, and return the events that followed from it."""
+        if action not in ACTIONS:
+            raise ValueError(f'unknown action: {action!r}')
+        if self._over:
+            return []
+        faller = self._current_faller
+        events = []
         try:
-            if self._board[col][row + 1] == 0:
-                return True
-            else:
-                return False
-        except IndexError:
-            return False
-    
-    def _generate_new_board(self):
-        """Create a new game board."""
-        two_dimensional_list = []
-        for column in range(NUMBER_OF_COLUMNS):
-            two_dimensional_list.append([])
-            for row in range(NUMBER_OF_ROWS + 3): # The +3 here adds an additional 3 rows to each column, where the faller will be initialized.
-                two_dimensional_list[-1].append(0)
-        return two_dimensional_list
+            if action == LEFT:
+                faller.move(faller.column_num - 1)
+            elif action == RIGHT:
+                faller.move(faller.column_num + 1)
+            elif action == ROTATE:
+                faller.rotate()
+            elif action == DROP:
+                while not faller.frozen:
+                    faller.fall()
+            else: # DOWN and TICK both make the faller fall one cell.
+                faller.fall()
+        except GameOverError:
+            self._over = True
+            events.append(GameEvent(EVENT_GAME_OVER))
+            return events
+        if faller.frozen:
+            self._pieces_placed += 1
+            events.append(GameEvent(EVENT_LANDED, faller.cells()))
+            self._resolve_matches(events)
+            self._spawn_faller(events)
+        return events
+
+    def _resolve_matches(self, events: [GameEvent]) -> None:
+        """Match, delete and apply gravity until the board settles, adding a matched event for every round."""
+        for step in self._board.resolve_cascade():
+            events.append(GameEvent(EVENT_MATCHED, step.cells, step.score_delta, step.chain, step.donuts))
+
+    def _spawn_faller(self, events: [GameEvent] = None) -> None:
+        """Insert the next faller into a random column, and create a new next faller."""
+        self._current_faller, self._next_faller = self._next_faller, self._sequence.faller(self._board.faller_length())
+        self._current_faller.insert(self._board, self._sequence.spawn_column())
+        if events is not None:
+            events.append(GameEvent(EVENT_SPAWNED, self._current_faller.cells()))
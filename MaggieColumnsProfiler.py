@@ -0,0 +1,164 @@
+# MaggieColumnsProfiler
+# This module times the phases of every frame of the game, and the model calls made inside them, along with the latency
+# from a key press to the next frame that is pushed to the display. The results can be summarized for an on-screen overlay,
+# and exported as CSV (one row per frame) or as a Chrome trace, which can be opened in chrome://tracing or https://ui.perfetto.dev.
+#
+# Example: python MaggieColumnsView.py --profile frames.json (F3 shows the overlay while playing)
+
+import csv
+import json
+import time
+from collections import deque, namedtuple
+
+# A finished frame. start and duration are in nanoseconds from time.perf_counter_ns().
+# events holds a (name, start, duration, depth) tuple for every timed section, in the order the sections ended.
+# latencies holds the nanoseconds from each key press handled in the frame, or in earlier frames, to the end of this frame,
+# which is the first frame since the key press to push anything to the display.
+FrameRecord = namedtuple('FrameRecord', ['index', 'start', 'duration', 'events', 'latencies'])
+
+
+class _Section:
+    """Context manager that times one section of a frame. Sections may be nested; depth records how deeply."""
+    __slots__ = ('_profiler', '_name', '_start')
+
+    def __init__(self, profiler: 'FrameProfiler', name: str):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._profiler._depth += 1
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter_ns()
+        profiler = self._profiler
+        profiler._depth -= 1
+        profiler._events.append((self._name, self._start, end - self._start, profiler._depth))
+        return False
+
+
+class FrameProfiler:
+    """Collects the timed sections of each frame between begin_frame() and end_frame().
+
+    Only the last max_frames frames are kept, so a long session uses a bounded amount of memory.
+    """
+
+    def __init__(self, max_frames: int = 36000):
+        self._origin = time.perf_counter_ns()
+        self._frames = deque(maxlen=max_frames)
+        self._frame_index = 0
+        self._frame_start = None
+        self._events = []
+        self._depth = 0
+        self._pending_inputs = [] # Times of key presses that have not been shown on screen yet.
+        self._latencies = []
+        self._presented = False # Whether the current frame has pushed anything to the display.
+
+    def section(self, name: str) -> _Section:
+        """Return a context manager that times the code inside it as a section of the current frame."""
+        return _Section(self, name)
+
+    def begin_frame(self) -> None:
+        self._frame_start = time.perf_counter_ns()
+        self._events = []
+        self._latencies = []
+        self._presented = False
+
+    def end_frame(self) -> None:
+        """Finish the current frame. If the frame was presented, every key press handled so far gets its latency."""
+        end = time.perf_counter_ns()
+        if self._presented:
+            self._latencies.extend(end - pressed for pressed in self._pending_inputs)
+            self._pending_inputs.clear()
+        self._frames.append(FrameRecord(self._frame_index, self._frame_start, end - self._frame_start, self._events, self._latencies))
+        self._frame_index += 1
+
+    def input_received(self) -> None:
+        """Note that a key press was just handled. Its latency runs until the end of the next frame that is presented."""
+        self._pending_inputs.append(time.perf_counter_ns())
+
+    def frame_presented(self) -> None:
+        """Note that the current frame pushed something to the display. Frames that change nothing on screen do not end latencies."""
+        self._presented = True
+
+    def frames(self) -> [FrameRecord]:
+        return list(self._frames)
+
+    def summary(self, last: int = 300) -> dict:
+        """Summarize the last frames, in milliseconds: frame time percentiles, the mean and maximum of every section per frame,
+        and input latency percentiles.
+        """
+        frames = list(self._frames)[-last:]
+        frame_times = [frame.duration / 1e6 for frame in frames]
+        latencies = [latency / 1e6 for frame in frames for latency in frame.latencies]
+        section_totals = {}
+        for frame in frames:
+            for name, total in _section_totals(frame).items():
+                section_totals.setdefault(name, []).append(total / 1e6)
+        return {
+            'frames': len(frames),
+            'frame_ms': {'p50': percentile(frame_times, 0.50), 'p95': percentile(frame_times, 0.95),
+                         'p99': percentile(frame_times, 0.99), 'max': max(frame_times, default=0.0)},
+            # A section that did not run in a frame counts as 0 ms for that frame.
+            'sections_ms': {name: {'mean': sum(totals) / len(frames), 'max': max(totals)} for name, totals in section_totals.items()},
+            'latency_ms': {'count': len(latencies), 'p50': percentile(latencies, 0.50), 'p95': percentile(latencies, 0.95),
+                           'max': max(latencies, default=0.0)},
+        }
+
+    def write_csv(self, path: str) -> None:
+        """Write one row per frame: its start and duration, the total time of every section, and the key press latencies."""
+        frames = list(self._frames)
+        names = []
+        for frame in frames:
+            for name, start, duration, depth in frame.events:
+                if name not in names:
+                    names.append(name)
+        with open(path, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(['frame', 'start_ms', 'frame_ms'] + [f'{name}_ms' for name in names] + ['inputs', 'max_latency_ms'])
+            for frame in frames:
+                totals = _section_totals(frame)
+                writer.writerow([frame.index, f'{(frame.start - self._origin) / 1e6:.3f}', f'{frame.duration / 1e6:.3f}']
+                                + [f'{totals.get(name, 0) / 1e6:.3f}' for name in names]
+                                + [len(frame.latencies), f'{max(frame.latencies, default=0) / 1e6:.3f}'])
+
+    def write_chrome_trace(self, path: str) -> None:
+        """Write the frames in the Chrome trace event format. Frames and their sections are on one track, key press latencies on another."""
+        events = []
+        for frame in self._frames:
+            end = frame.start + frame.duration
+            events.append(self._trace_event(f'frame {frame.index}', frame.start, frame.duration, 1))
+            for name, start, duration, depth in frame.events:
+                events.append(self._trace_event(name, start, duration, 1))
+            for latency in frame.latencies:
+                events.append(self._trace_event('input latency', end - latency, latency, 2))
+        with open(path, 'w') as trace_file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, trace_file)
+
+    def export(self, path: str) -> None:
+        """Write a Chrome trace if path ends in .json, and CSV otherwise."""
+        if path.lower().endswith('.json'):
+            self.write_chrome_trace(path)
+        else:
+            self.write_csv(path)
+
+    def _trace_event(self, name: str, start: int, duration: int, thread: int) -> dict:
+        # Complete ('X') events, with times in microseconds since the profiler was created.
+        return {'name': name, 'ph': 'X', 'ts': (start - self._origin) / 1e3, 'dur': duration / 1e3, 'pid': 1, 'tid': thread}
+
+
+def _section_totals(frame: FrameRecord) -> {str: int}:
+    """Return the total nanoseconds spent in each section of a frame, since a section can run many times in one frame."""
+    totals = {}
+    for name, start, duration, depth in frame.events:
+        totals[name] = totals.get(name, 0) + duration
+    return totals
+
+
+def percentile(values: [float], fraction: float) -> float:
+    """Return the value below which the given fraction of the values fall (nearest rank), or 0.0 if there are no values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
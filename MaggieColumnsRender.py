@@ -0,0 +1,192 @@
+# MaggieColumnsRender
+# This module draws recorded or computer played games frame by frame without a window, as fast as they can be drawn,
+# using the drawing code of MaggieColumnsView on an offscreen surface. Frames are written as PNG files, as raw RGB video
+# on standard output, or as contact sheets of thumbnails, and many games are rendered at once on a pool of processes.
+#
+# PNG frames:     python MaggieColumnsRender.py game1.mgr game2.mgr --frames out
+# Video:          python MaggieColumnsRender.py game1.mgr --raw | ffmpeg -f rawvideo -pix_fmt rgb24 -s 1120x630 -r 30 -i - game1.mp4
+# Contact sheets: python MaggieColumnsRender.py --auto 16 --sheets out
+
+import os
+
+# Select SDL's dummy video driver, so that no window is ever opened, and keep pygame's greeting off standard output,
+# which may be carrying raw video. SDL's own signal handlers are turned off as well, since they would keep worker
+# processes from being stopped by SIGTERM. All of this has to happen before pygame is imported and initialized.
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ['SDL_NO_SIGNAL_HANDLERS'] = '1'
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+
+import argparse
+import multiprocessing
+import struct
+import sys
+import time
+import zlib
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+import MaggieColumnsAI
+import MaggieColumnsReplay
+import MaggieColumnsView
+
+FRAME_RATE = 30 # Frames per second of game time. Must divide the logic rate of every game rendered, which recordings store.
+SHEET_INTERVAL = 60 # Frames between two thumbnails of a contact sheet.
+SHEET_COLUMNS = 8 # Thumbnails in a row of a contact sheet.
+THUMBNAIL_WIDTH = 240
+PNG_COMPRESSION = 1 # zlib level of PNG frames. The photographic background barely compresses better at higher levels, but takes much longer.
+PNG_THREADS = 4 # Threads that compress PNG frames while the next frames are drawn. zlib lets go of the GIL while it works.
+
+# What to render: a recording file, or a game played by the computer player from a seed. name is used for the output files.
+RenderJob = namedtuple('RenderJob', ['name', 'recording_path', 'seed'])
+
+# Where the frames of a job go. frames_dir gets one PNG per frame, sheets_dir one contact sheet per job, and raw writes every
+# frame to standard output as packed RGB bytes. Any combination can be used.
+RenderOptions = namedtuple('RenderOptions', ['size', 'frame_rate', 'max_frames', 'frames_dir', 'sheets_dir', 'raw', 'sheet_interval',
+                                             'sheet_columns', 'thumbnail_width'],
+                           defaults=((1120, 630), FRAME_RATE, 18000, None, None, False, SHEET_INTERVAL, SHEET_COLUMNS, THUMBNAIL_WIDTH))
+
+
+def render_job(job: RenderJob, options: RenderOptions) -> (str, int):
+    """Render one game as options describe, and return its name and the number of frames drawn."""
+    logic_rate = MaggieColumnsView.LOGIC_RATE
+    if job.recording_path:
+        recording = MaggieColumnsReplay.Recording.load(job.recording_path)
+        logic_rate = recording.logic_rate # The game replays at the rate it was recorded at.
+        if logic_rate % options.frame_rate:
+            raise ValueError(f'{job.recording_path} was recorded at {logic_rate} ticks per second, which {options.frame_rate} frames per second do not divide')
+        game = MaggieColumnsView.MaggieGame(replay=recording, offscreen=options.size)
+    else:
+        game = MaggieColumnsView.MaggieGame(auto_player=MaggieColumnsAI.AutoPlayer(), seed=job.seed, offscreen=options.size)
+    frames_dir = os.path.join(options.frames_dir, job.name) if options.frames_dir else None
+    if frames_dir:
+        os.makedirs(frames_dir, exist_ok=True)
+    thumbnails = []
+    frame_count = 0
+    encoder = ThreadPoolExecutor(PNG_THREADS)
+    pending = deque() # PNG frames being written. Only a few are kept in flight, so that memory stays bounded.
+    for frame_count, surface in enumerate(game.frames(logic_rate // options.frame_rate, options.max_frames), 1):
+        pixels = pygame.image.tobytes(surface, 'RGB') if frames_dir or options.raw else None
+        if frames_dir:
+            if len(pending) >= 2 * PNG_THREADS:
+                pending.popleft().result()
+            pending.append(encoder.submit(write_png, os.path.join(frames_dir, f'{frame_count:06d}.png'), pixels, surface.get_size()))
+        if options.raw:
+            sys.stdout.buffer.write(pixels)
+        if options.sheets_dir and (frame_count - 1) % options.sheet_interval == 0:
+            width, height = surface.get_size()
+            thumbnails.append(pygame.transform.smoothscale(surface, (options.thumbnail_width, max(1, height * options.thumbnail_width // width))))
+    for write in pending:
+        write.result()
+    encoder.shutdown()
+    if options.sheets_dir and thumbnails:
+        os.makedirs(options.sheets_dir, exist_ok=True)
+        pygame.image.save(contact_sheet(thumbnails, options.sheet_columns), os.path.join(options.sheets_dir, f'{job.name}.png'))
+    if options.raw:
+        sys.stdout.buffer.flush()
+    return job.name, frame_count
+
+
+def write_png(path: str, pixels: bytes, size: (int, int)) -> None:
+    """Write packed 24 bit RGB pixels as a PNG file, compressed at PNG_COMPRESSION. Can run on any thread."""
+    width, height = size
+    stride = width * 3
+    # Every row starts with the number of its filter, and 0 means no filter.
+    rows = b''.join(b'\x00' + pixels[row * stride:(row + 1) * stride] for row in range(height))
+    with open(path, 'wb') as png_file:
+        png_file.write(b'\x89PNG\r\n\x1a\n')
+        _write_png_chunk(png_file, b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) # 8 bits per channel, RGB.
+        _write_png_chunk(png_file, b'IDAT', zlib.compress(rows, PNG_COMPRESSION))
+        _write_png_chunk(png_file, b'IEND', b'')
+
+
+def _write_png_chunk(png_file, kind: bytes, data: bytes) -> None:
+    png_file.write(struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data)))
+
+
+def contact_sheet(thumbnails: [pygame.Surface], columns: int = SHEET_COLUMNS) -> pygame.Surface:
+    """Return the thumbnails, which must all have the same size, laid out left to right and top to bottom in rows of columns."""
+    width, height = thumbnails[0].get_size()
+    columns = min(columns, len(thumbnails))
+    sheet = pygame.Surface((width * columns, height * -(-len(thumbnails) // columns)))
+    sheet.fill((0, 0, 0))
+    sheet.blits([(thumbnail, ((index % columns) * width, (index // columns) * height)) for index, thumbnail in enumerate(thumbnails)],
+                doreturn=False)
+    return sheet
+
+
+def _render_job_task(task: (RenderJob, RenderOptions)) -> (str, int):
+    """Unpack a task tuple for render_job. Pool.imap_unordered only passes a single argument to the worker."""
+    return render_job(*task)
+
+
+def render_all(jobs: [RenderJob], options: RenderOptions, workers: int = None, on_result=None) -> None:
+    """Render every job, across a pool of worker processes when there is more than one job. workers defaults to the number of CPU cores.
+    If on_result is given, it is called with the (name, frames) of every job as it finishes.
+    """
+    if options.raw and len(jobs) > 1:
+        raise ValueError('raw video can only be written for one game at a time')
+    if len(jobs) == 1 or workers == 1:
+        for job in jobs:
+            result = render_job(job, options)
+            if on_result:
+                on_result(result)
+        return
+    with multiprocessing.Pool(min(len(jobs), workers or multiprocessing.cpu_count())) as pool:
+        for result in pool.imap_unordered(_render_job_task, ((job, options) for job in jobs)):
+            if on_result:
+                on_result(result)
+
+
+def main(argv: [str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Render recorded or computer played games of MaggieColumns without a window.')
+    parser.add_argument('recordings', nargs='*', help='recording files, as written by MaggieColumnsView.py --record')
+    parser.add_argument('--auto', type=int, default=0, metavar='GAMES', help='also render this many games played by the computer')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first computer played game; each following game uses the next seed')
+    parser.add_argument('--frames', default=None, metavar='DIR', help='write every frame as a PNG file to DIR/<game>/')
+    parser.add_argument('--sheets', default=None, metavar='DIR', help='write a contact sheet of thumbnails to DIR/<game>.png')
+    parser.add_argument('--raw', action='store_true', help='write every frame to standard output as raw 24 bit RGB')
+    parser.add_argument('--size', default='1120x630', help='frame size, as WIDTHxHEIGHT')
+    parser.add_argument('--fps', type=int, default=FRAME_RATE, help=f'frames per second of game time; must divide the logic rate of every game '
+                        f'({MaggieColumnsView.LOGIC_RATE} for computer played games)')
+    parser.add_argument('--max-frames', type=int, default=18000, help='frames after which a game is cut off')
+    parser.add_argument('--sheet-interval', type=int, default=SHEET_INTERVAL, help='frames between two thumbnails of a contact sheet')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='number of worker processes (default: one per core)')
+    args = parser.parse_args(argv)
+
+    jobs = [RenderJob(os.path.splitext(os.path.basename(path))[0], path, None) for path in args.recordings]
+    jobs += [RenderJob(f'seed{seed}', None, seed) for seed in range(args.seed, args.seed + args.auto)]
+    if not jobs:
+        parser.error('give recording files, or --auto')
+    if not (args.frames or args.sheets or args.raw):
+        parser.error('choose at least one of --frames, --sheets and --raw')
+    if args.raw and len(jobs) > 1:
+        parser.error('--raw can only write one game at a time')
+    if args.fps <= 0:
+        parser.error('--fps must be positive')
+    logic_rates = {MaggieColumnsView.LOGIC_RATE} if args.auto else set()
+    for path in args.recordings:
+        try:
+            logic_rates.add(MaggieColumnsReplay.Recording.load(path).logic_rate)
+        except (OSError, ValueError) as error:
+            parser.error(f'{path}: {error}')
+    for logic_rate in sorted(logic_rates):
+        if logic_rate % args.fps:
+            parser.error(f'--fps {args.fps} does not divide {logic_rate}, the logic rate of some of the games')
+    size = tuple(int(number) for number in args.size.lower().split('x'))
+    options = RenderOptions(size, args.fps, args.max_frames, args.frames, args.sheets, args.raw, args.sheet_interval)
+
+    start = time.perf_counter()
+    totals = []
+    def report(result):
+        totals.append(result[1])
+        print(f'{result[0]}: {result[1]} frames', file=sys.stderr) # Standard output may be carrying raw video.
+    render_all(jobs, options, args.workers, report)
+    seconds = time.perf_counter() - start
+    print(f'{sum(totals)} frames of {len(totals)} game(s) in {seconds:.2f}s, {sum(totals) / seconds:.0f} frames per second', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
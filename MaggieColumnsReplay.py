@@ -0,0 +1,174 @@
+# MaggieColumnsReplay
+# This module records games as a seed plus the stream of actions performed on the fallers, stores them in small binary files,
+# and replays them, either headless at full speed or in the window in real time.
+#
+# Verify recordings: python MaggieColumnsReplay.py game1.mgr game2.mgr ...
+# Watch a recording: python MaggieColumnsReplay.py --watch game1.mgr
+
+import argparse
+import struct
+import sys
+import time
+
+import MaggieColumnsModel
+
+# File layout, all little-endian:
+#   header:  magic, format version (B), seed (Q), logic rate (H), number of actions (I),
+#            and the shape of the board: columns (H), visible rows (H), hidden rows (B), faller length (B), match length (B)
+#   actions: one unsigned varint per action, holding (ticks since the previous action << 3) | action code
+#   footer:  final score (I), pieces placed (I), length of the final board (I), the final board from Board.to_bytes()
+MAGIC = b'MGRC'
+VERSION = 3 # Version 3 games draw their pieces from a MaggieColumnsModel.PieceSequence.
+_HEADER = struct.Struct('<4sBQHIHHBBB')
+_FOOTER = struct.Struct('<III')
+
+ACTION_CODES = {
+    MaggieColumnsModel.LEFT: 0,
+    MaggieColumnsModel.RIGHT: 1,
+    MaggieColumnsModel.DOWN: 2,
+    MaggieColumnsModel.ROTATE: 3,
+    MaggieColumnsModel.TICK: 4,
+    MaggieColumnsModel.DROP: 5,
+}
+_ACTIONS_BY_CODE = {code: action for action, code in ACTION_CODES.items()}
+
+
+class ReplayMismatchError(Exception):
+    pass
+
+
+class Recording:
+    """The seed and board shape (see Board.shape()) of a game, every action performed on its fallers with the logic tick it happened on,
+    and the final score and board.
+
+    Actions are only recorded when they were actually performed on an active faller, so replaying them in order through a
+    MaggieColumnsModel.Game with the same seed reproduces the game exactly, however long its match animations took.
+    """
+
+    def __init__(self, seed: int, logic_rate: int = 60, shape: dict = None):
+        self.seed = seed
+        self.logic_rate = logic_rate
+        self.shape = shape if shape else MaggieColumnsModel.Board().shape()
+        self.actions = [] # (tick, action) pairs, in order.
+        self.final_score = None
+        self.final_pieces_placed = None
+        self.final_board = None
+
+    def record(self, tick: int, action: str) -> None:
+        self.actions.append((tick, action))
+
+    def finish(self, score: int, pieces_placed: int, board: MaggieColumnsModel.Board) -> None:
+        """Store the final state of the game, which replays are checked against."""
+        self.final_score = score
+        self.final_pieces_placed = pieces_placed
+        self.final_board = board.to_bytes()
+
+    def to_bytes(self) -> bytes:
+        shape = self.shape
+        data = bytearray(_HEADER.pack(MAGIC, VERSION, self.seed, self.logic_rate, len(self.actions), shape['columns'], shape['rows'],
+                                      shape['hidden_rows'], shape['faller_length'], shape['match_length']))
+        previous_tick = 0
+        for tick, action in self.actions:
+            _write_varint(data, ((tick - previous_tick) << 3) | ACTION_CODES[action])
+            previous_tick = tick
+        final_board = self.final_board or b''
+        data += _FOOTER.pack(self.final_score or 0, self.final_pieces_placed or 0, len(final_board))
+        data += final_board
+        return bytes(data)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Recording':
+        if data[:4] != MAGIC or data[4:5] != bytes([VERSION]):
+            raise ValueError('not a MaggieColumns recording, or a recording from another version')
+        magic, version, seed, logic_rate, count, columns, rows, hidden_rows, faller_length, match_length = _HEADER.unpack_from(data)
+        shape = {'columns': columns, 'rows': rows, 'hidden_rows': hidden_rows, 'faller_length': faller_length, 'match_length': match_length}
+        recording = cls(seed, logic_rate, shape)
+        position = _HEADER.size
+        tick = 0
+        for index in range(count):
+            value, position = _read_varint(data, position)
+            tick += value >> 3
+            recording.actions.append((tick, _ACTIONS_BY_CODE[value & 0b111]))
+        recording.final_score, recording.final_pieces_placed, board_length = _FOOTER.unpack_from(data, position)
+        position += _FOOTER.size
+        recording.final_board = bytes(data[position:position + board_length]) if board_length else None
+        return recording
+
+    def save(self, path: str) -> None:
+        with open(path, 'wb') as recording_file:
+            recording_file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> 'Recording':
+        with open(path, 'rb') as recording_file:
+            return cls.from_bytes(recording_file.read())
+
+
+def _write_varint(data: bytearray, value: int) -> None:
+    """Append an unsigned integer 7 bits at a time, with the high bit of each byte set when more bytes follow."""
+    while value >= 0x80:
+        data.append((value & 0x7F) | 0x80)
+        value >>= 7
+    data.append(value)
+
+
+def _read_varint(data: bytes, position: int) -> (int, int):
+    """Read an unsigned integer written by _write_varint, and return it along with the position after it."""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def replay(recording: Recording) -> MaggieColumnsModel.Game:
+    """Replay a recording headless, as fast as possible, and return the Game in its final state."""
+    game = MaggieColumnsModel.Game(recording.seed, MaggieColumnsModel.Board(**recording.shape))
+    for tick, action in recording.actions:
+        game.step(action)
+    return game
+
+
+def verify(recording: Recording) -> MaggieColumnsModel.Game:
+    """Replay a recording headless, and raise ReplayMismatchError if the final score or board differ from the recorded ones."""
+    game = replay(recording)
+    if recording.final_score is not None and game.score() != recording.final_score:
+        raise ReplayMismatchError(f'score is {game.score()}, recorded {recording.final_score}')
+    if recording.final_pieces_placed is not None and game.pieces_placed() != recording.final_pieces_placed:
+        raise ReplayMismatchError(f'{game.pieces_placed()} pieces placed, recorded {recording.final_pieces_placed}')
+    if recording.final_board is not None and game.board().to_bytes() != recording.final_board:
+        raise ReplayMismatchError('final board differs from the recorded board')
+    return game
+
+
+def main(argv: [str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Verify or watch recorded games of MaggieColumns.')
+    parser.add_argument('recordings', nargs='+', help='recording files, as written by MaggieColumnsView.py --record')
+    parser.add_argument('--watch', action='store_true', help='replay the recordings in the game window, in real time')
+    args = parser.parse_args(argv)
+
+    if args.watch:
+        import MaggieColumnsView
+        for path in args.recordings:
+            MaggieColumnsView.MaggieGame(replay=Recording.load(path)).run()
+        return 0
+
+    failures = 0
+    start = time.perf_counter()
+    for path in args.recordings:
+        try:
+            game = verify(Recording.load(path))
+            print(f'{path}: ok, score {game.score()}')
+        except (ReplayMismatchError, ValueError, struct.error) as error:
+            failures += 1
+            print(f'{path}: FAILED, {error}')
+    print(f'{len(args.recordings)} recording(s) replayed in {time.perf_counter() - start:.2f}s, {failures} failed')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
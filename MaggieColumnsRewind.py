@@ -0,0 +1,167 @@
+# MaggieColumnsRewind
+# This module keeps the last few hundred states of a game in a fixed amount of memory, so that the player can step back one
+# faller at a time. Only the newest state is stored whole. Every older one is packed into a few bytes: its score, fallers and
+# sequence state, and the runs of cells where its board differs from the state after it.
+#
+# Example: python MaggieColumnsRewind.py --games 5 --capacity 256
+
+import argparse
+import re
+import struct
+import time
+from collections import deque
+
+import MaggieColumnsAI
+import MaggieColumnsModel
+
+# Entry layout, all little-endian:
+#   header:  score (I), pieces placed (I), column of the current faller (H), jewels drawn (I), columns drawn (I), number of runs (H),
+#            then the jewels of the current and next faller
+#   runs:    start (I) and length (H) of a run of cells, then the cells of the older board in that run
+_ENTRY = struct.Struct('<IIHIIH')
+_RUN = struct.Struct('<IH')
+# Runs of changed cells closer together than the size of a run header are stored as one run, which is smaller.
+_CHANGED_RUNS = re.compile(rb'[^\x00]+(?:\x00{1,%d}[^\x00]+)*' % _RUN.size)
+
+
+class RewindBuffer:
+    """The newest capacity + 1 MaggieColumnsModel.Snapshots of a game, newest last.
+
+    push() the snapshot of every new faller as it spawns, and step_back() to drop the newest one and get the one before it.
+    Once capacity snapshots are behind the newest one, pushing another forgets the oldest. Both take time in proportion to
+    the size of the board, and barely any more for a big cascade. nbytes() is the memory the snapshots take up.
+    """
+
+    def __init__(self, capacity: int = 256):
+        self._capacity = capacity
+        self._newest = None
+        self._entries = deque() # The older snapshots, oldest first, each packed as the difference from the one after it.
+        self._nbytes = 0
+
+    def __len__(self):
+        """Return the number of snapshots, including the newest one."""
+        return len(self._entries) + (self._newest is not None)
+
+    def newest(self) -> MaggieColumnsModel.Snapshot:
+        return self._newest
+
+    def nbytes(self) -> int:
+        """Return the number of bytes used by the boards and packed entries, not counting Python's own overhead."""
+        return self._nbytes + (len(self._newest.grid) if self._newest else 0)
+
+    def clear(self) -> None:
+        self._newest = None
+        self._entries.clear()
+        self._nbytes = 0
+
+    def push(self, snapshot: MaggieColumnsModel.Snapshot) -> None:
+        if self._newest is not None and self._capacity:
+            if len(self._entries) == self._capacity:
+                self._nbytes -= len(self._entries.popleft())
+            entry = self._pack(self._newest, snapshot.grid)
+            self._entries.append(entry)
+            self._nbytes += len(entry)
+        self._newest = snapshot
+
+    def step_back(self) -> MaggieColumnsModel.Snapshot:
+        """Forget the newest snapshot and return the one before it, which becomes the newest. Raise IndexError if there is none."""
+        if not self._entries:
+            raise IndexError('no earlier snapshot to step back to')
+        entry = self._entries.pop()
+        self._nbytes -= len(entry)
+        self._newest = self._unpack(entry, self._newest)
+        return self._newest
+
+    @staticmethod
+    def _pack(snapshot: MaggieColumnsModel.Snapshot, newer_grid: bytes) -> bytes:
+        """Pack a snapshot as the difference from the grid of the snapshot after it."""
+        size = len(newer_grid)
+        # XOR the grids as two big integers, so that the cells that are the same come out as zero bytes without a loop in Python.
+        changed = (int.from_bytes(snapshot.grid, 'little') ^ int.from_bytes(newer_grid, 'little')).to_bytes(size, 'little')
+        runs = [(match.start(), snapshot.grid[match.start():match.end()]) for match in _CHANGED_RUNS.finditer(changed)]
+        data = bytearray(_ENTRY.pack(snapshot.score, snapshot.pieces_placed, snapshot.column, *snapshot.sequence_state, len(runs)))
+        data += snapshot.current + snapshot.next
+        for start, cells in runs:
+            data += _RUN.pack(start, len(cells)) + cells
+        return bytes(data)
+
+    @staticmethod
+    def _unpack(entry: bytes, newer: MaggieColumnsModel.Snapshot) -> MaggieColumnsModel.Snapshot:
+        """Return the snapshot packed in entry by _pack(), given the snapshot after it."""
+        score, pieces_placed, column, jewels_drawn, columns_drawn, run_count = _ENTRY.unpack_from(entry)
+        faller_length = len(newer.current)
+        position = _ENTRY.size + 2 * faller_length
+        current, next_jewels = entry[_ENTRY.size:_ENTRY.size + faller_length], entry[_ENTRY.size + faller_length:position]
+        grid = bytearray(newer.grid)
+        for run in range(run_count):
+            start, length = _RUN.unpack_from(entry, position)
+            position += _RUN.size
+            grid[start:start + length] = entry[position:position + length]
+            position += length
+        return MaggieColumnsModel.Snapshot(bytes(grid), score, current, column, next_jewels, (jewels_drawn, columns_drawn), pieces_placed)
+
+
+def check_game(player: MaggieColumnsAI.AutoPlayer, seed: int, capacity: int, max_fallers: int = 1000) -> (int, int, float, float):
+    """Play a headless game with the player, pushing a snapshot for every faller, then step all the way back and check every
+    snapshot against the one that was pushed, and that the game and a new PieceSequence can go on from the oldest one. Return the fallers placed, the bytes the buffer used at its fullest, and the
+    average seconds of a push and of a step back.
+    """
+    game = MaggieColumnsModel.Game(seed)
+    buffer = RewindBuffer(capacity)
+    snapshots = []
+    most_bytes = 0
+    push_seconds = 0.0
+    while True:
+        snapshot = game.snapshot()
+        start = time.perf_counter()
+        buffer.push(snapshot)
+        push_seconds += time.perf_counter() - start
+        snapshots.append(snapshot)
+        most_bytes = max(most_bytes, buffer.nbytes())
+        if game.is_over() or game.pieces_placed() >= max_fallers:
+            break
+        for action in player.plan(game.board(), game.current_faller(), game.next_faller()):
+            game.step(action)
+    step_seconds = 0.0
+    for expected in reversed(snapshots[-capacity - 1:-1]):
+        start = time.perf_counter()
+        snapshot = buffer.step_back()
+        step_seconds += time.perf_counter() - start
+        if snapshot != expected:
+            raise AssertionError(f'seed {seed}: the snapshot after {expected.pieces_placed} fallers did not come back the same')
+    # The game can go on from the oldest snapshot left, and plays out the same way as it did the first time.
+    game.restore(buffer.newest())
+    replayed = game.snapshot()
+    if replayed != buffer.newest():
+        raise AssertionError(f'seed {seed}: restoring the snapshot after {replayed.pieces_placed} fallers changed it')
+    # A new sequence sent straight to the state of that snapshot draws what one that got there draw by draw does.
+    jewels_drawn, columns_drawn = replayed.sequence_state
+    sequence, drawn = MaggieColumnsModel.PieceSequence(seed), MaggieColumnsModel.PieceSequence(seed)
+    sequence.set_state(replayed.sequence_state)
+    drawn.jewels(jewels_drawn)
+    for column in range(columns_drawn):
+        drawn.spawn_column()
+    if sequence.jewels(30) != drawn.jewels(30) or [sequence.spawn_column() for draw in range(10)] != [drawn.spawn_column() for draw in range(10)]:
+        raise AssertionError(f'seed {seed}: a new sequence set to {replayed.sequence_state} draws differently')
+    steps = min(capacity, len(snapshots) - 1)
+    return len(snapshots) - 1, most_bytes, push_seconds / len(snapshots), step_seconds / steps if steps else 0.0
+
+
+def main(argv: [str] = None) -> None:
+    parser = argparse.ArgumentParser(description='Check and measure the rewind buffer of MaggieColumns on games of the computer player.')
+    parser.add_argument('--games', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game; each following game uses the next seed')
+    parser.add_argument('--capacity', type=int, default=256, help='snapshots kept behind the newest one')
+    parser.add_argument('--max-fallers', type=int, default=1000, help='fallers after which a game is stopped')
+    args = parser.parse_args(argv)
+
+    player = MaggieColumnsAI.AutoPlayer()
+    for seed in range(args.seed, args.seed + args.games):
+        fallers, most_bytes, push_seconds, step_seconds = check_game(player, seed, args.capacity, args.max_fallers)
+        kept = min(fallers, args.capacity)
+        print(f'seed {seed}: {fallers} fallers, {most_bytes} bytes for {kept + 1} snapshots ({100 * most_bytes / (kept + 1):.0f} bytes per 100), '
+              f'{push_seconds * 1e6:.1f}us per push, {step_seconds * 1e6:.1f}us per step back')
+
+
+if __name__ == '__main__':
+    main()
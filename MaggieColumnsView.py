@@ -1,10 +1,109 @@
 # MaggieColumnsView
 # This module implements the pygame UI for the game.
 
+import MaggieColumnsAssets
 import MaggieColumnsModel
+import MaggieColumnsProfiler
+import MaggieColumnsReplay
+import MaggieColumnsRewind
+import argparse
+import contextlib
 import pygame
 import random
+import time
 from math import floor, ceil
+from typing import Iterator
+
+
+class SpriteCache:
+    """Every board cell value drawn once at a single cell size, packed side by side into one atlas surface.
+
+    Each sprite is the sticker of a jewel with the overlay for its state already composited on top (or underneath, for matched pieces),
+    so a cell costs a single blit from the atlas. The atlas is converted to the display's pixel format, so blitting from it needs no conversion.
+    Sprites are stored with premultiplied alpha, which makes drawing one composited sprite look the same as drawing its two layers in turn.
+    A cache is only valid for the cell size it was built with; build a new one when the window is resized.
+    """
+
+    # The overlay drawn with each state, and whether the overlay goes above the sticker.
+    _OVERLAYS = {
+        MaggieColumnsModel.FALLING: ('Falling', False),
+        MaggieColumnsModel.LANDED: ('Landed', False),
+        MaggieColumnsModel.FROZEN: (None, False),
+        MaggieColumnsModel.MATCHED: ('Matched', True),
+    }
+
+    def __init__(self, images: dict, cell_size: (int, int)):
+        self._cell_size = cell_size
+        self._areas = {} # Packed cell value -> area of the atlas that holds its sprite.
+        cells = [MaggieColumnsModel.encode_cell(jewel, state) for jewel in MaggieColumnsModel.MAGGIE_JEWELS for state in self._OVERLAYS]
+        atlas = pygame.Surface((cell_size[0] * len(cells), cell_size[1]), pygame.SRCALPHA)
+        atlas.fill((0, 0, 0, 0))
+        for position, cell in enumerate(cells):
+            area = pygame.Rect((position * cell_size[0], 0), cell_size)
+            sticker = images[MaggieColumnsModel.MAGGIE_JEWELS[MaggieColumnsModel.cell_jewel(cell)]]
+            overlay, overlay_on_top = self._OVERLAYS[MaggieColumnsModel.cell_state(cell)]
+            layers = [sticker] if overlay is None else [sticker, images[overlay]] if overlay_on_top else [images[overlay], sticker]
+            for layer in layers:
+                atlas.blit(layer.premul_alpha(), area, special_flags=pygame.BLEND_PREMULTIPLIED)
+            self._areas[cell] = area
+        self._atlas = atlas.convert_alpha()
+
+    def cell_size(self) -> (int, int):
+        return self._cell_size
+
+    def blit_sequence(self, placements: [(int, (int, int))]) -> [(pygame.Surface, (int, int), pygame.Rect)]:
+        """Turn (cell, position) pairs into the sequence that pygame.Surface.blits() expects."""
+        atlas, areas = self._atlas, self._areas
+        return [(atlas, position, areas[cell], pygame.BLEND_PREMULTIPLIED) for cell, position in placements]
+
+
+# Phases of the match process that runs after a faller freezes, in the order they happen.
+# The check phase looks for matches. Highlight shows the matched pieces, delete shows the gaps they leave, and fall shows the pieces after gravity.
+# After fall, the process goes back to check, until no more matches are found.
+PHASE_CHECK = 'check'
+PHASE_HIGHLIGHT = 'highlight'
+PHASE_DELETE = 'delete'
+PHASE_FALL = 'fall'
+# How long each phase is shown for, in milliseconds.
+MATCH_PHASE_DURATIONS = {
+    PHASE_CHECK: 0,
+    PHASE_HIGHLIGHT: 1000,
+    PHASE_DELETE: 100,
+    PHASE_FALL: 0,
+}
+
+# Where the board is drawn on the background image, at its full 1120x630 size: the left and top edge, and the width and height
+# of the area that the cells are fitted into. The default 6x13 board fills it with 45 pixel cells.
+BOARD_LEFT = 290
+BOARD_TOP = 22.5
+BOARD_WIDTH = 270
+BOARD_HEIGHT = 585
+
+# The game logic (gravity and the match process) runs in fixed steps called ticks, separately from drawing frames.
+LOGIC_RATE = 60 # Ticks per second.
+RENDER_RATE = 60 # Frames per second. 0 means as many frames as the machine can draw.
+MAX_FRAME_TIME = 250 # Milliseconds. A longer frame only catches up this much logic, so a stall can not snowball into more and more ticks.
+# Speed levels. The faller falls one cell every FALL_SECONDS at level 1, and the wait is multiplied by FALL_SPEEDUP for every level after that.
+FALL_SECONDS = 1.0
+FALL_SPEEDUP = 0.85
+MIN_FALL_SECONDS = 0.05
+FALLERS_PER_LEVEL = 20 # The level goes up after this many fallers have frozen.
+AUTO_PLAYER_TICKS = 6 # Logic ticks between two actions of a computer player, so that its moves can be followed on screen.
+
+# The keys the player uses, and the actions (see MaggieColumnsModel.ACTIONS) they perform.
+KEY_ACTIONS = {
+    pygame.K_LEFT: MaggieColumnsModel.LEFT,
+    pygame.K_RIGHT: MaggieColumnsModel.RIGHT,
+    pygame.K_DOWN: MaggieColumnsModel.DOWN,
+    pygame.K_SPACE: MaggieColumnsModel.ROTATE,
+}
+OVERLAY_KEY = pygame.K_F3 # Shows and hides the profiling overlay.
+REWIND_KEY = pygame.K_BACKSPACE # Takes back the last faller that froze, in games that are not recorded, replayed or played by the computer.
+REWIND_CAPACITY = 256 # Fallers that can be taken back, one after another.
+OVERLAY_REFRESH = 250 # Milliseconds between updates of the profiling overlay, so that drawing it barely shows up in what it measures.
+_NOT_PROFILED = contextlib.nullcontext() # Stands in for a profiler section when profiling is off.
+RESIZE_DEBOUNCE = 150 # Milliseconds without another resize event before the window is laid out for its new size.
+
 
 class MaggieGame:
     """This class controls the process of running the MaggieColumns game.
@@ -14,37 +113,119 @@ class MaggieGame:
     while running:
         handle events
         redraw frame
+
+    The match process is spread over many frames (see _advance_match_phase), so the window keeps responding while it runs.
+    phase_durations can override any of the durations in MATCH_PHASE_DURATIONS.
+
+    Game logic runs logic_rate ticks per second, no matter how often frames are drawn (see _handle_framerate).
+    render_rate limits the frames per second, where 0 means no limit, and vsync asks the display to wait for the monitor's refresh.
+    The game starts at start_level and speeds up every FALLERS_PER_LEVEL fallers.
+    If an auto_player (see MaggieColumnsAI.AutoPlayer) is given, it plans the moves of every faller and the game plays them out.
+
+    The pieces and spawn columns come from a MaggieColumnsModel.PieceSequence created from seed, which is picked at random if it is not given.
+    With record_to, every action performed on a faller is recorded with its logic tick, and the recording is saved to that file
+    when the game is closed. With replay (a MaggieColumnsReplay.Recording), the recorded actions are played back instead of
+    the keys and gravity, at the logic rate of the recording, and the final score and board are checked against the recording.
+
+    Games that are not recorded, replayed or played by the computer keep the last REWIND_CAPACITY fallers in a MaggieColumnsRewind.RewindBuffer,
+    and REWIND_KEY takes them back one at a time: the board, score and fallers go back to how they were when the faller spawned.
+    After the game is over, the first press brings back the faller that ended it.
+
+    With profile, every frame is timed section by section (see MaggieColumnsProfiler), and OVERLAY_KEY shows the results on screen.
+    Pressing OVERLAY_KEY also starts profiling if it was off. With profile_to, the timings are written to that file when the game is closed.
+
+    The window is shown right away with placeholder images, while the real images and the sounds load on a background thread
+    (see MaggieColumnsAssets). startup_times() reports how long the first frame and the images took.
+
+    The game is played on an empty board of the default shape, unless it is given an empty MaggieColumnsModel.Board of another shape.
+    Cells are sized so that the whole board fits the board area of the background (see BOARD_WIDTH and BOARD_HEIGHT).
+
+    With an offscreen size, the game draws to a pygame.Surface of that size instead of a window, and is played through frames()
+    instead of run(): without a clock, events or sound, as fast as it can be drawn. The real images are loaded before the first frame.
+    A display mode still has to be set to convert the images, so the SDL dummy video driver should be selected (see MaggieColumnsRender).
     """
 
-    def __init__(self):
+    def __init__(self, phase_durations: dict = None, logic_rate: int = LOGIC_RATE, render_rate: int = RENDER_RATE,
+                 vsync: bool = False, start_level: int = 1, auto_player=None, seed: int = None, record_to: str = None, replay=None,
+                 profile: bool = False, profile_to: str = None, board: MaggieColumnsModel.Board = None, offscreen: (int, int) = None):
         # Define Initial Values.
+        self._started_at = time.perf_counter()
+        self._time_to_first_frame = None
         self._running = True
+        self._game_over = False
         self._faller_active = False
         self._current_faller = None
         self._next_faller = None
-        self._looking_for_matches = False
-        self._surface_size = (1120, 630) # Initial window size.
-        self._cell_size = (45, 45)
-        self._faller_controller = 0 # Controls when the faller falls.
-        self._game_board = MaggieColumnsModel.Board()
-        # Create image dictionary containing filenames.
-        self._initialize_image_names()
-        # Initialize pygame.
-        pygame.init()
+        self._match_phase = None # The current phase of the match process, or None when it is not running.
+        self._phase_time_left = 0 # Milliseconds until the current phase ends.
+        self._cascade = [] # The MaggieColumnsModel.CascadeStep of every round of the current match process, see _delete_current_faller.
+        self._cascade_position = 0 # The round being shown.
+        self._phase_durations = dict(MATCH_PHASE_DURATIONS, **(phase_durations or {}))
+        self._logic_rate = replay.logic_rate if replay else logic_rate # A replay runs at the rate it was recorded at.
+        self._render_rate = render_rate
+        self._vsync = vsync
+        self._tick_accumulator = 0 # Milliseconds of time not yet simulated, multiplied by the logic rate, so that it is always an integer.
+        self._start_level = start_level
+        self._fallers_frozen = 0
+        self._auto_player = auto_player
+        self._auto_plan = [] # Actions the auto player still wants to perform on the current faller.
+        self._auto_player_controller = 0 # Counts ticks until the auto player's next action.
+        self._offscreen = offscreen is not None
+        self._surface_size = tuple(offscreen) if offscreen else (1120, 630) # Initial window size.
+        self._faller_controller = 0 # Counts ticks until the faller falls.
+        self._tick_count = 0 # Logic ticks since the game started. Recorded actions are stamped with it.
+        self._replay = replay
+        self._replay_position = 0 # Index of the next recorded action to play back.
+        if replay:
+            seed = replay.seed
+        elif seed is None:
+            seed = random.randrange(2 ** 32)
+        self._record_to = record_to
+        if replay:
+            board = MaggieColumnsModel.Board(**replay.shape)
+        self._game_board = board if board is not None else MaggieColumnsModel.Board()
+        self._sequence = MaggieColumnsModel.PieceSequence(seed, self._game_board.columns())
+        self._cell_size = self._fitted_cell_size()
+        self._recording = MaggieColumnsReplay.Recording(seed, logic_rate, self._game_board.shape()) if record_to else None
+        practice = not (record_to or replay or auto_player)
+        self._rewind_buffer = MaggieColumnsRewind.RewindBuffer(REWIND_CAPACITY) if practice else None
+        self._profiler = MaggieColumnsProfiler.FrameProfiler() if profile or profile_to else None
+        self._profile_to = profile_to
+        self._show_overlay = False
+        self._overlay_font = None
+        self._overlay_surface = None # The overlay as it was last updated, see _draw_overlay.
+        self._drawn_overlay_rect = None
+        self._overlay_drawn_at = 0 # pygame.time.get_ticks() when the overlay was last drawn.
+        # Initialize the parts of pygame that are needed for the first frame. The mixer is started later, by the asset loader.
+        pygame.display.init()
+        pygame.font.init()
         self._clock = pygame.time.Clock()
-        self._surface = pygame.display.set_mode(self._surface_size, pygame.RESIZABLE)
+        self._woken_by = None # The event that ended the last wait for a change, see _handle_framerate.
+        self._surface = self._set_display_mode()
+        # Start with placeholder images, and load the real images and the sounds in the background. See _check_loaded_assets.
+        # Images need the display to exist, so they can be converted to its pixel format.
+        self._sounds = MaggieColumnsAssets.SoundBank()
+        self._image_library = MaggieColumnsAssets.ImageLibrary()
+        self._pending_resize = None # (size, pygame.time.get_ticks() at which to apply it) while the window is being resized.
+        if self._offscreen: # Nobody is waiting to see the first frame, and the sounds are never loaded.
+            self._images = MaggieColumnsAssets.convert_images(MaggieColumnsAssets.load_images(self._surface_size, self._cell_size))
+            self._asset_loader = None
+        else:
+            self._images = MaggieColumnsAssets.placeholder_images(self._surface_size, self._cell_size)
+            self._asset_loader = MaggieColumnsAssets.AssetLoader(self._surface_size, self._cell_size, self._sounds, self._image_library)
+            self._asset_loader.start()
+        self._assets_loaded_after = None
+        self._sprites = None # The SpriteCache for the current cell size. Built on the first frame that needs it.
         self._score_surface = None # The score is a pygame Font object that is a pygame surface.
+        # What is currently on the screen, so that each frame only redraws what changed. See _redraw_frame.
+        self._full_redraw = True
+        self._drawn_cells = None
+        self._drawn_next_faller = None
+        self._drawn_score = None
+        self._drawn_score_rect = None
         pygame.display.set_caption('Maggie Columns')
         # Blit the background image onto the surface.
         self._surface.blit(self._images['BG'], (0, 0)) # (0, 0) places it in the upper right corner.
-        # Load Sounds
-        pygame.mixer.music.load('./assets/ttm.mp3')
-        pygame.mixer.music.set_volume(0.1)
-        pygame.mixer.music.play(-1) # The -1 argument causes the music to loop indefinitely.
-        self._rotate_sound = pygame.mixer.Sound('./assets/swish.wav')
-        self._rotate_sound.set_volume(0.25) # Lower the volume, relative to the other sounds.
-        self._landed_sound = pygame.mixer.Sound('./assets/landed.wav')
-        self._match_sound = pygame.mixer.Sound('./assets/match.wav')
 
     
     def run(self) -> None:
@@ -52,163 +233,535 @@ class MaggieGame:
         self._create_new_faller()
         
         while self._running:
-            self._handle_framerate()
-            self._handle_events()
+            # OVERLAY_KEY can start profiling partway through a frame, so a frame is only ended by the profiler that began it.
+            profiler = self._profiler
+            if profiler:
+                profiler.begin_frame()
+            with self._profile('wait_for_frame'):
+                ticks = self._handle_framerate()
+            with self._profile('handle_events'):
+                changed = self._handle_events()
+                self._apply_pending_resize()
+            with self._profile('advance_logic'):
+                for tick in range(ticks):
+                    self._advance_logic()
+            self._check_loaded_assets()
+            # A frame without ticks or input has nothing new to show, unless the whole window or the overlay needs drawing.
+            if ticks or changed or self._full_redraw or self._show_overlay:
+                with self._profile('redraw_frame'):
+                    self._redraw_frame()
+            if profiler:
+                profiler.end_frame()
+        self._finish_session()
+
+    def frames(self, ticks_per_frame: int = 2, max_frames: int = None) -> Iterator[pygame.Surface]:
+        """Play an offscreen game, ticks_per_frame logic ticks per frame, and yield the surface after every frame is drawn.
+
+        The game ends when it is over, when a replay has played all of its actions and their matches, or after max_frames frames.
+        The same surface is yielded every time, so each frame has to be saved or copied before the next one is asked for.
+        """
+        self._create_new_faller()
+        frame_count = 0
+        while max_frames is None or frame_count < max_frames:
+            for tick in range(ticks_per_frame):
+                self._advance_logic()
             self._redraw_frame()
+            yield self._surface
+            frame_count += 1
+            if self._game_over or (self._replay and self._replay_position == len(self._replay.actions) and not self._match_phase):
+                return
+
+    def startup_times(self) -> dict:
+        """Return the seconds from creating the game to its first frame on screen, and to its images being ready, or None for
+        what has not happened yet.
+        """
+        return {'first_frame': self._time_to_first_frame, 'assets': self._assets_loaded_after}
+
+    def _profile(self, name: str):
+        """Return a context manager that times the code inside it as a section of the current frame, if profiling is on."""
+        return self._profiler.section(name) if self._profiler else _NOT_PROFILED
 
     # Private methods called to start the game.
     def _create_new_faller(self) -> None:
         """Cycle to the next faller, or create both a current and next faller if starting the game."""
         if self._next_faller: # If there is a next faller. At the start, this is None.
             # The next faller becomes the current faller. And the new next faller is initialized (but not inserted).
-            self._current_faller, self._next_faller = self._next_faller, MaggieColumnsModel.Faller()
-            self._current_faller.insert(self._game_board.board(), random.randint(0, 5))
+            self._current_faller, self._next_faller = self._next_faller, self._sequence.faller(self._game_board.faller_length())
+            self._current_faller.insert(self._game_board, self._sequence.spawn_column())
         else:
             # Create two fallers to be the current and next faller.
-            self._current_faller, self._next_faller = MaggieColumnsModel.Faller(), MaggieColumnsModel.Faller()
-            self._current_faller.insert(self._game_board.board(), random.randint(0, 5)) # Insert the current faller.
+            # They draw from the sequence in the same order as MaggieColumnsModel.Game, so recordings can be replayed through it.
+            faller_length = self._game_board.faller_length()
+            self._current_faller, self._next_faller = self._sequence.faller(faller_length), self._sequence.faller(faller_length)
+            self._current_faller.insert(self._game_board, self._sequence.spawn_column()) # Insert the current faller.
         self._faller_active = True
+        if self._rewind_buffer is not None:
+            self._rewind_buffer.push(MaggieColumnsModel.take_snapshot(self._game_board, self._current_faller, self._next_faller,
+                                                                      self._sequence, self._fallers_frozen))
+        if self._auto_player:
+            self._auto_plan = self._auto_player.plan(self._game_board, self._current_faller, self._next_faller)
 
     # Private methods called by main game loop.
-    def _handle_framerate(self) -> None:
-        """Tick the clock, and advance the faller controller value."""
-        self._clock.tick(60) # 60 Frames per second.
-        self._faller_controller = (self._faller_controller + 1) % 60
+    def _handle_framerate(self) -> int:
+        """Wait until the game next changes, tick the clock, and return the number of logic ticks that are due after the time that passed.
+
+        While nothing is due to change for longer than a frame, such as while the faller waits for its next fall, the loop blocks
+        in pygame.event.wait instead of drawing identical frames. Any event ends the wait at once, so input is handled as quickly as before.
+        Leftover time is carried over to the next frame, so the number of ticks over any stretch of time only depends on the time
+        that passed, not on how it was split into frames.
+        """
+        wait = self._time_until_change()
+        if wait is None or wait > 1000 / (self._render_rate or self._logic_rate):
+            # A timeout of 0 would wait forever, so the timeout is never rounded down to it.
+            self._woken_by = pygame.event.wait(0 if wait is None else ceil(wait))
+        frame_time = self._clock.tick(self._render_rate)
+        # The planned wait is not a stall, so it is caught up in full.
+        self._tick_accumulator += min(frame_time, MAX_FRAME_TIME + (wait or 0)) * self._logic_rate
+        ticks, self._tick_accumulator = divmod(self._tick_accumulator, 1000)
+        return ticks
+
+    def _time_until_change(self) -> float:
+        """Return the milliseconds until the game next changes on its own, 0 if it may change any time, or None if it never does."""
+        if self._full_redraw or self._asset_loader or self._profiler:
+            return 0 # Loading, and the profiler's frame times, are watched frame by frame.
+        now = pygame.time.get_ticks()
+        times = []
+        if self._pending_resize:
+            times.append(self._pending_resize[1] - now)
+        ticks = []
+        if self._faller_active:
+            if self._replay:
+                if self._replay_position < len(self._replay.actions):
+                    ticks.append(self._replay.actions[self._replay_position][0] - self._tick_count)
+            else:
+                ticks.append(self._ticks_per_fall() - self._faller_controller)
+                if self._auto_plan:
+                    ticks.append(AUTO_PLAYER_TICKS - self._auto_player_controller)
+        if self._match_phase:
+            ticks.append(ceil(self._phase_time_left * self._logic_rate / 1000))
+        if ticks:
+            # The tick accumulator already holds part of the time until the next tick.
+            times.append((min(ticks) * 1000 - self._tick_accumulator) / self._logic_rate)
+        return max(0, min(times)) if times else None
+
+    def _advance_logic(self) -> None:
+        """Run one tick of game logic: gravity while a faller is active, or the match process otherwise."""
+        self._tick_count += 1
+        if self._replay:
+            self._advance_replay()
+            if not self._faller_active and self._match_phase:
+                self._advance_match_phase(1000 / self._logic_rate)
+            return
+        if self._faller_active and self._auto_plan:
+            self._auto_player_controller += 1
+            if self._auto_player_controller >= AUTO_PLAYER_TICKS:
+                self._auto_player_controller = 0
+                self._apply_action(self._auto_plan.pop(0))
+                self._check_for_frozen_faller()
+        if self._faller_active:
+            with self._profile('advance_faller'):
+                self._advance_faller()
+                self._check_for_frozen_faller()
+        elif self._match_phase: # Faller is not active.
+            with self._profile('match_phase'):
+                self._advance_match_phase(1000 / self._logic_rate)
+
+    def _advance_replay(self) -> None:
+        """Play back the recorded actions that are due by this tick. An action waits for the faller if it is not active yet."""
+        actions = self._replay.actions
+        while self._faller_active and self._replay_position < len(actions) and actions[self._replay_position][0] <= self._tick_count:
+            self._apply_action(actions[self._replay_position][1])
+            self._replay_position += 1
+            self._check_for_frozen_faller()
+
+    def _level(self) -> int:
+        return self._start_level + self._fallers_frozen // FALLERS_PER_LEVEL
+
+    def _ticks_per_fall(self) -> int:
+        """Return the number of logic ticks between two falls of the faller at the current level."""
+        seconds = max(MIN_FALL_SECONDS, FALL_SECONDS * FALL_SPEEDUP ** (self._level() - 1))
+        return max(1, round(seconds * self._logic_rate))
     
-    def _handle_events(self) -> None:
-        """Handle pygame events and player inputs. Call functions to handle the landing and cycling of fallers."""
-        for event in pygame.event.get():
+    def _handle_events(self) -> bool:
+        """Handle pygame events and player inputs. Call functions to handle the landing and cycling of fallers.
+        Return True if an input changed the game.
+        """
+        changed = False
+        events = pygame.event.get()
+        if self._woken_by: # The event that ended the wait in _handle_framerate came first.
+            events.insert(0, self._woken_by)
+            self._woken_by = None
+        for event in events:
             if event.type == pygame.QUIT:
                 self._running = False
             elif event.type == pygame.VIDEORESIZE:
-                self._resize_surface(event.size)
+                # Dragging a window edge sends many of these. Only the size the window settles on is laid out, see _apply_pending_resize.
+                self._pending_resize = (event.size, pygame.time.get_ticks() + RESIZE_DEBOUNCE)
+            elif event.type == pygame.VIDEOEXPOSE: # The window contents were lost, so the next frame has to draw everything.
+                self._full_redraw = True
             elif event.type == pygame.KEYDOWN:
-                if self._faller_active:
-                    if event.key == pygame.K_LEFT: # Left Arrow Key
-                        self._current_faller.move(self._current_faller.column_num - 1)
-
-                    if event.key == pygame.K_RIGHT: # Right arrow key.
-                        self._current_faller.move(self._current_faller.column_num + 1)
+                if event.key == OVERLAY_KEY:
+                    self._toggle_overlay()
+                elif event.key == REWIND_KEY and self._rewind_buffer is not None and (self._faller_active or self._game_over):
+                    self._rewind()
+                    changed = True
+                elif self._faller_active and not self._replay and event.key in KEY_ACTIONS:
+                    if self._profiler:
+                        self._profiler.input_received()
+                    self._apply_action(KEY_ACTIONS[event.key])
+                    self._check_for_frozen_faller() # So that later keys in this frame never move a frozen faller.
+                    changed = True
+        return changed
 
-                    if event.key == pygame.K_DOWN: # Down arrow key.
+    def _apply_action(self, action: str) -> None:
+        """Perform one of the actions in MaggieColumnsModel.ACTIONS on the current faller, and record it if the game is being recorded."""
+        if self._recording:
+            self._recording.record(self._tick_count, action)
+        with self._profile(f'faller.{action}'):
+            try:
+                if action == MaggieColumnsModel.LEFT:
+                    self._current_faller.move(self._current_faller.column_num - 1)
+                elif action == MaggieColumnsModel.RIGHT:
+                    self._current_faller.move(self._current_faller.column_num + 1)
+                elif action == MaggieColumnsModel.ROTATE:
+                    self._current_faller.rotate()
+                    self._sounds.play('rotate')
+                elif action == MaggieColumnsModel.DROP:
+                    while not self._current_faller.frozen:
                         self._current_faller.fall()
+                else: # DOWN and TICK.
+                    self._current_faller.fall()
+            except MaggieColumnsModel.GameOverError:
+                # The board stays on screen as it ended until the window is closed.
+                self._game_over = True
+                self._faller_active = False
+                self._sounds.stop_music()
 
-                    if event.key == pygame.K_SPACE: # Space bar.
-                        self._current_faller.rotate()
-                        self._rotate_sound.play()
-        
-        if self._faller_active:
-            self._advance_faller()
-            if self._current_faller.frozen: # If after advancing, the faller has reached it's landed state,
-                self._landed_sound.play()
-                self._delete_current_faller()
-        else: # Faller is not active.
-            self._process_matches()
+    def _rewind(self) -> None:
+        """Go back to when the previous faller spawned, or to when the current one did if the game is over. See REWIND_KEY."""
+        if self._game_over:
+            snapshot = self._rewind_buffer.newest()
+        elif len(self._rewind_buffer) > 1:
+            snapshot = self._rewind_buffer.step_back()
+        else:
+            return
+        self._game_board, self._current_faller, self._next_faller = MaggieColumnsModel.restore_snapshot(snapshot, self._sequence,
+                                                                                                        self._game_board.shape())
+        self._fallers_frozen = snapshot.pieces_placed
+        self._faller_controller = 0
+        self._faller_active = True
+        self._game_over = False
+        self._reset_cached_score_surface()
+        self._full_redraw = True
+
+    def _check_for_frozen_faller(self) -> None:
+        if self._faller_active and self._current_faller.frozen: # If after advancing, the faller has reached it's landed state,
+            self._sounds.play('landed')
+            self._fallers_frozen += 1
+            self._delete_current_faller()
 
     def _redraw_frame(self) -> None:
+        """Redraw the board cells, next faller and score that changed since the last frame, and push only those regions to the display.
+
+        Each changed region is first restored from the background image. The first frame, and the first frame after the window
+        is resized or exposed, draws and flips the whole window instead.
+        """
+        if self._full_redraw:
+            self._redraw_full_frame()
+            return
+        dirty_rects = []
+        # Board cells whose packed value changed. Whole columns are compared first, so that large boards only look cell by cell
+        # at the few columns that changed.
+        cells = self._game_board.to_bytes()
+        if cells != self._drawn_cells:
+            rows = self._game_board.rows()
+            hidden_rows = self._game_board.hidden_rows() # Hidden rows are never drawn.
+            drawn_cells = self._drawn_cells
+            placements = []
+            for col in range(self._game_board.columns()):
+                start, end = col * rows + hidden_rows, (col + 1) * rows
+                if cells[start:end] != drawn_cells[start:end]:
+                    for index in range(start, end):
+                        cell = cells[index]
+                        if cell != drawn_cells[index]:
+                            cell_rect = self._cell_rect(col, index - start)
+                            dirty_rects.append(cell_rect)
+                            if cell != MaggieColumnsModel.EMPTY:
+                                placements.append((cell, cell_rect.topleft))
+            background = self._images['BG']
+            self._surface.blits([(background, cell_rect, cell_rect) for cell_rect in dirty_rects], doreturn=False)
+            self._draw_cells(placements)
+            self._drawn_cells = cells
+        # The "next" faller.
+        next_faller = self._next_faller_ids()
+        if next_faller != self._drawn_next_faller:
+            next_faller_rect = self._next_faller_rect()
+            self._restore_background(next_faller_rect)
+            self._draw_next_faller()
+            dirty_rects.append(next_faller_rect)
+            self._drawn_next_faller = next_faller
+        # The score. The old text is erased first, since the new text may be narrower.
+        if self._game_board.score() != self._drawn_score:
+            self._restore_background(self._drawn_score_rect)
+            dirty_rects.append(self._drawn_score_rect)
+            self._drawn_score_rect = self._draw_score()
+            dirty_rects.append(self._drawn_score_rect)
+            self._drawn_score = self._game_board.score()
+        # The profiling overlay, which is updated a few times a second. It reaches over the left edge of the board, so cells drawn
+        # under it in between are covered with it again. The area under it is redrawn first, since the overlay is translucent.
+        if self._show_overlay:
+            refresh = pygame.time.get_ticks() - self._overlay_drawn_at >= OVERLAY_REFRESH
+            if refresh or self._drawn_overlay_rect.collidelist(dirty_rects) != -1:
+                self._restore_background(self._drawn_overlay_rect)
+                self._redraw_cells_in(self._drawn_overlay_rect)
+                dirty_rects.append(self._drawn_overlay_rect)
+                self._drawn_overlay_rect = self._draw_overlay(refresh)
+                dirty_rects.append(self._drawn_overlay_rect)
+
+        if dirty_rects and not self._offscreen:
+            pygame.display.update(dirty_rects)
+            if self._profiler:
+                self._profiler.frame_presented()
+
+    def _redraw_full_frame(self) -> None:
         """Draw the background image, and all the pieces on top of it."""
         # First, draw the background image.
         self._surface.blit(self._images['BG'], (0, 0))
         # Then, draw all the pieces.
-        for row in range(3, MaggieColumnsModel.NUMBER_OF_ROWS + 3): # +3 because we want rows 3 through 16. 0 through 2 are hidden.
-            for col in range(MaggieColumnsModel.NUMBER_OF_COLUMNS):
-                if type(self._game_board.board()[col][row]) == MaggieColumnsModel.Piece:
-                    self._draw_piece(col, row - 3, self._game_board.board()[col][row]) # To account for hidden rows when drawing.
+        placements = []
+        hidden_rows = self._game_board.hidden_rows()
+        for row in range(hidden_rows, self._game_board.rows()): # The hidden rows at the top are never drawn.
+            for col in range(self._game_board.columns()):
+                cell = self._game_board.cell(col, row)
+                if cell != MaggieColumnsModel.EMPTY:
+                    placements.append((cell, self._cell_rect(col, row - hidden_rows).topleft)) # To account for hidden rows when drawing.
+        self._draw_cells(placements)
         # Draw the "next" faller.
         self._draw_next_faller()
         # Draw the score.
-        self._draw_score()
+        self._drawn_score_rect = self._draw_score()
+        # Draw the profiling overlay.
+        self._drawn_overlay_rect = self._draw_overlay() if self._show_overlay else None
+        # Remember what was drawn, for _redraw_frame.
+        self._full_redraw = False
+        self._drawn_cells = self._game_board.to_bytes()
+        self._drawn_next_faller = self._next_faller_ids()
+        self._drawn_score = self._game_board.score()
 
-        pygame.display.flip()
+        if not self._offscreen:
+            pygame.display.flip()
+            if self._profiler:
+                self._profiler.frame_presented()
+        if self._time_to_first_frame is None:
+            self._time_to_first_frame = time.perf_counter() - self._started_at
     
     # Private methods called upon initialization.
-    def _initialize_image_names(self) -> None:
-        self._images = {
-            'BG': pygame.transform.scale(pygame.image.load(f"./assets/BG_work.png"), self._surface_size),
-            'H' : pygame.transform.scale(pygame.image.load(f"./assets/Smile.png"), self._cell_size),
-            'S' : pygame.transform.scale(pygame.image.load(f"./assets/Pout.png"), self._cell_size),
-            'M' : pygame.transform.scale(pygame.image.load(f"./assets/Moustache.png"), self._cell_size),
-            'R' : pygame.transform.scale(pygame.image.load(f"./assets/Rude.png"), self._cell_size),
-            'G' : pygame.transform.scale(pygame.image.load(f"./assets/Sparkle.png"), self._cell_size),
-            'L' : pygame.transform.scale(pygame.image.load(f"./assets/Lick.png"), self._cell_size),
-            'B' : pygame.transform.scale(pygame.image.load(f"./assets/BlownUp.png"), self._cell_size),
-            'O' : pygame.transform.scale(pygame.image.load(f"./assets/Donut.png"), self._cell_size),
-            'Falling': pygame.transform.scale(pygame.image.load(f"./assets/Falling.png"), self._cell_size),
-            'Landed' : pygame.transform.scale(pygame.image.load(f"./assets/Landed.png"), self._cell_size),
-            'Matched': pygame.transform.scale(pygame.image.load(f"./assets/Matched.png"), self._cell_size)
-        }
+    def _set_display_mode(self) -> pygame.Surface:
+        """Create the window at _surface_size. If vsync was requested but the display can not provide it, fall back to no vsync.
+        An offscreen game gets a plain surface at _surface_size, and the smallest window, which is never shown.
+        """
+        if self._offscreen:
+            pygame.display.set_mode((1, 1))
+            return pygame.Surface(self._surface_size)
+        if self._vsync:
+            try:
+                return pygame.display.set_mode(self._surface_size, pygame.RESIZABLE | pygame.SCALED, vsync=1)
+            except pygame.error:
+                self._vsync = False
+        return pygame.display.set_mode(self._surface_size, pygame.RESIZABLE)
+
+    def _load_images(self) -> None:
+        """Get the images for the current window and cell size, preferably scaled from the originals in memory.
+        Placeholders are used while the background load is still running.
+        """
+        if self._asset_loader:
+            self._images = MaggieColumnsAssets.placeholder_images(self._surface_size, self._cell_size)
+        elif self._image_library.has_originals():
+            self._images = self._image_library.images(self._surface_size, self._cell_size)
+        else: # The originals are still being decoded in the background, so this size comes from the disk cache instead.
+            self._images = MaggieColumnsAssets.convert_images(MaggieColumnsAssets.load_images(self._surface_size, self._cell_size))
+            self._image_library.add(self._images, self._surface_size, self._cell_size)
+
+    def _check_loaded_assets(self) -> None:
+        """Once the background load has finished, swap the placeholders for the real images and redraw everything with them."""
+        if not (self._asset_loader and self._asset_loader.ready()):
+            return
+        loader, self._asset_loader = self._asset_loader, None
+        self._assets_loaded_after = time.perf_counter() - self._started_at
+        if (loader.surface_size, loader.cell_size) == (self._surface_size, self._cell_size):
+            self._images = MaggieColumnsAssets.convert_images(loader.images())
+            self._image_library.add(self._images, self._surface_size, self._cell_size)
+        else: # The window was resized while loading.
+            self._load_images()
+        self._sprites = None
+        self._full_redraw = True
+
+    # Private methods called when the game is closed.
+    def _finish_session(self) -> None:
+        """Write the profile, and save the recording or check the replay against the state the game is in once any running
+        match process has finished.
+        """
+        if self._profile_to:
+            self._profiler.export(self._profile_to)
+        if not (self._recording or self._replay):
+            return
+        if self._match_phase:
+            # MaggieColumnsModel.Game resolves every match as soon as a faller freezes, so the view catches up before comparing.
+            self._advance_match_phase(float('inf'))
+        if self._recording:
+            self._recording.finish(self._game_board.score(), self._fallers_frozen, self._game_board)
+            self._recording.save(self._record_to)
+        elif self._replay_position < len(self._replay.actions):
+            print(f'Replay stopped after {self._replay_position} of {len(self._replay.actions)} actions.')
+        elif (self._game_board.score() != self._replay.final_score or self._game_board.to_bytes() != self._replay.final_board):
+            print(f'Replay does not match the recording: score {self._game_board.score()}, recorded {self._replay.final_score}.')
+        else:
+            print(f'Replay matches the recording: score {self._game_board.score()}.')
 
     # Private methods called by the _handle_events method.
+    def _apply_pending_resize(self) -> None:
+        if self._pending_resize and pygame.time.get_ticks() >= self._pending_resize[1]:
+            size, due = self._pending_resize
+            self._pending_resize = None
+            self._resize_surface(size)
+
     def _resize_surface(self, new_size:(int, int)) -> None:
         """Change the _surface_size instance variable and re-define surface to be resized."""
         self._surface_size = new_size
-        self._cell_size = (floor((45/1120) * self._surface_size[0]), floor((45/630) * self._surface_size[1]))
-        self._surface = pygame.display.set_mode(self._surface_size, pygame.RESIZABLE) # Updated _surface_size.
-        self._initialize_image_names()
+        self._cell_size = self._fitted_cell_size()
+        self._surface = self._set_display_mode() # Updated _surface_size.
+        self._load_images()
+        self._sprites = None # The sprites were drawn at the old cell size.
         self._reset_cached_score_surface()
+        self._full_redraw = True
 
     def _advance_faller(self) -> None:
-        """Advance the faller."""
-        if self._faller_controller == 0:
-            self._current_faller.fall()
+        """Count one logic tick, and make the faller fall once enough ticks have passed for the current level."""
+        self._faller_controller += 1
+        if self._faller_controller >= self._ticks_per_fall():
+            self._faller_controller = 0
+            self._apply_action(MaggieColumnsModel.TICK)
 
     def _delete_current_faller(self) -> None:
-        """Delete current faller and change the gamestate to be looking for matches."""
+        """Delete current faller and change the gamestate to be looking for matches.
+
+        The whole chain is resolved at once on a copy of the board, and the match phases then show it on the real board one round at a time.
+        """
         del self._current_faller
         self._faller_active = False
-        self._looking_for_matches = True
+        with self._profile('board.resolve_cascade'):
+            self._cascade = self._game_board.clone().resolve_cascade()
+        self._cascade_position = 0
+        self._start_match_phase(PHASE_CHECK)
     
-    def _process_matches(self) -> None:
-        """Handle the match process. Tell the game board to start looking for matches. Reinstate the faller once finished."""
-        while True:
-            # This method of the game board marks pieces as matched.
-            if self._game_board.find_matches(): # If matches are found (this method of the game board also marks pieces as matched).
-                self._redraw_frame() # Redraw to show the matched pieces.
-                self._match_sound.play()
-                self._clock.tick(1)
-                if self._game_board.delete_matched_pieces(): # If any pieces were deleted.
-                    self._reset_cached_score_surface()
-                    self._redraw_frame() # Draw the frame, showing the gaps where pieces used to be.
-                    self._clock.tick(10)
-                    self._game_board.apply_gravity() # Make the pieces fall.
-                    self._redraw_frame() # Show that they've fallen.
+    def _start_match_phase(self, phase: str) -> None:
+        self._match_phase = phase
+        self._phase_time_left += self._phase_durations[phase]
+
+    def _advance_match_phase(self, elapsed: int) -> None:
+        """Advance the match process by elapsed milliseconds. Reinstate the faller once it is finished.
+
+        Every phase that has run out of time makes its change to the board and starts the next phase, so a slow frame can finish
+        more than one phase. The board is only drawn by the main loop, so no phase ever waits inside a frame.
+        """
+        self._phase_time_left -= elapsed
+        while self._match_phase and self._phase_time_left <= 0:
+            if self._match_phase == PHASE_CHECK:
+                if self._cascade_position < len(self._cascade):
+                    self._game_board.mark_matched(self._cascade[self._cascade_position].cells)
+                    self._sounds.play('match')
+                    self._start_match_phase(PHASE_HIGHLIGHT)
                 else:
-                    break
+                    self._match_phase = None
+                    self._phase_time_left = 0
+                    self._cascade = []
+                    # The board is now where the copy ended up, which the cascade left without matches, so none of the cells
+                    # written since need to be searched again.
+                    self._game_board.clear_dirty_cells()
+                    self._create_new_faller() # After the entire match process is complete, insert a new faller.
+            elif self._match_phase == PHASE_HIGHLIGHT:
+                with self._profile('board.delete_matched_pieces'):
+                    self._game_board.delete_matched_pieces()
+                self._reset_cached_score_surface()
+                self._start_match_phase(PHASE_DELETE)
+            elif self._match_phase == PHASE_DELETE:
+                self._game_board.move_pieces(self._cascade[self._cascade_position].moves) # Make the pieces fall.
+                self._start_match_phase(PHASE_FALL)
             else:
-                break
-        self._create_new_faller() # After the entire match process is complete, insert a new faller.
+                self._cascade_position += 1
+                self._start_match_phase(PHASE_CHECK)
+
+    def _fitted_cell_size(self) -> (int, int):
+        """Return the size of a cell that fits the visible part of the board into the board area of the window, at least 1 pixel."""
+        # Integer arithmetic, so that the default board gets exactly floor(45 / 1120 * width) by floor(45 / 630 * height).
+        width = (BOARD_WIDTH * self._surface_size[0]) // (1120 * self._game_board.columns())
+        height = (BOARD_HEIGHT * self._surface_size[1]) // (630 * self._game_board.visible_rows())
+        return (max(1, width), max(1, height))
 
     # Private methods for drawing various objects.
     # Note that self._surface_size is a tuple containing the (width, height) of the surface, in pixels.
     # Dividing x and y by 1120 and 630 respectively ensures that the proportions are correct regardless of window size.
-    def _draw_piece(self, col: int, row: int, piece: MaggieColumnsModel.Piece) -> None:
-        """Draw the piece using the specified column and row."""
-        # Find the coordinates for the piece.
-        x_coord = floor((290 / 1120) * self._surface_size[0] + col * self._cell_size[0])
-        y_coord = floor((22.5 / 630) * self._surface_size[1] + row * self._cell_size[1])
-        # Blit the image onto the surface.
-        if piece.is_falling():
-            self._surface.blit(self._images['Falling'], (x_coord, y_coord))
-            self._surface.blit(self._images[piece.sticker()[1]], (x_coord, y_coord))
-        elif piece.is_landed():
-            self._surface.blit(self._images['Landed'], (x_coord, y_coord))
-            self._surface.blit(self._images[piece.sticker()[1]], (x_coord, y_coord))
-        elif piece.is_matched():
-            self._surface.blit(self._images[piece.sticker()[1]], (x_coord, y_coord))
-            self._surface.blit(self._images['Matched'], (x_coord, y_coord))
-        else:
-            self._surface.blit(self._images[piece.sticker()[1]], (x_coord, y_coord))
+    def _cell_rect(self, col: int, row: int) -> pygame.Rect:
+        """Return the area of the window covered by the board cell at the specified column and (visible) row."""
+        x_coord = floor((BOARD_LEFT / 1120) * self._surface_size[0] + col * self._cell_size[0])
+        y_coord = floor((BOARD_TOP / 630) * self._surface_size[1] + row * self._cell_size[1])
+        return pygame.Rect((x_coord, y_coord), self._cell_size)
+
+    def _next_faller_rect(self) -> pygame.Rect:
+        """Return the area of the window covered by the "next" faller."""
+        top_x_coord = floor((670 / 1120) * self._surface_size[0])
+        top_y_coord = floor((155.5 / 630) * self._surface_size[1])
+        return pygame.Rect(top_x_coord, top_y_coord, self._cell_size[0], self._cell_size[1] * len(self._next_faller))
+
+    def _next_faller_ids(self) -> (str,):
+        return tuple(piece.id() for piece in self._next_faller)
+
+    def _restore_background(self, rect: pygame.Rect) -> None:
+        """Cover an area of the window with the matching area of the background image."""
+        if rect:
+            self._surface.blit(self._images['BG'], rect, rect)
+
+    def _redraw_cells_in(self, rect: pygame.Rect) -> None:
+        """Draw the board cells that overlap an area of the window again, after the area was covered with the background."""
+        if not rect:
+            return
+        origin = self._cell_rect(0, 0)
+        width, height = self._cell_size
+        hidden_rows = self._game_board.hidden_rows()
+        first_col = max(0, (rect.left - origin.left) // width)
+        last_col = min(self._game_board.columns() - 1, (rect.right - 1 - origin.left) // width)
+        first_row = max(0, (rect.top - origin.top) // height)
+        last_row = min(self._game_board.visible_rows() - 1, (rect.bottom - 1 - origin.top) // height)
+        placements = []
+        for col in range(first_col, last_col + 1):
+            for row in range(first_row, last_row + 1):
+                cell = self._game_board.cell(col, row + hidden_rows)
+                if cell != MaggieColumnsModel.EMPTY:
+                    placements.append((cell, self._cell_rect(col, row).topleft))
+        # Cells are clipped to the area, since the parts of them outside it were never covered, and sprites with soft edges
+        # would come out darker if they were drawn over themselves.
+        self._surface.set_clip(rect)
+        self._draw_cells(placements)
+        self._surface.set_clip(None)
+
+    def _draw_cells(self, placements: [(int, (int, int))]) -> None:
+        """Draw packed board cells at the given window coordinates, in a single batch of blits from the sprite atlas."""
+        if self._sprites is None:
+            self._sprites = SpriteCache(self._images, self._cell_size)
+        self._surface.blits(self._sprites.blit_sequence(placements), doreturn=False)
 
     def _draw_next_faller(self) -> None:
         """Draw the pieces of the next faller to the right of the board."""
         top_x_coord = floor((670 / 1120) * self._surface_size[0])
         top_y_coord = floor((155.5 / 630) * self._surface_size[1])
-        for index in range(3): # The next faller has 3 pieces.
-            self._surface.blit(self._images[f"{self._next_faller[index].sticker()[1]}"], (top_x_coord, top_y_coord))
+        placements = []
+        for piece in self._next_faller: # The pieces are drawn without any overlay, like frozen pieces.
+            placements.append((MaggieColumnsModel.encode_cell(piece.jewel(), MaggieColumnsModel.FROZEN), (top_x_coord, top_y_coord)))
             top_y_coord += self._cell_size[1]
+        self._draw_cells(placements)
     
-    def _draw_score(self) -> None:
-        """Draw the score in the score space to the right of the board."""
+    def _draw_score(self) -> pygame.Rect:
+        """Draw the score in the score space to the right of the board. Return the area that was drawn to."""
         if self._score_surface == None: # If there is no score surface, make a new one.
             self._font_object = pygame.font.Font(None, 40) # None loads pygame default font. Size 40.
             self._score_surface = self._font_object.render(f"{self._game_board.score()}", True, [0, 0, 0])
@@ -220,13 +773,68 @@ class MaggieGame:
         score_x_coord = floor((693.5 / 1120) * self._surface_size[0] - (self._font_object.size(score_txt)[0] / 2))
         score_y_coord = floor((450.5 / 630 * self._surface_size[1]) - (self._font_object.size(score_txt)[1] / 2))
         # Blit the score surface onto the main surface.
-        self._surface.blit(self._score_surface, (score_x_coord, score_y_coord))
+        return self._surface.blit(self._score_surface, (score_x_coord, score_y_coord))
     
+    def _toggle_overlay(self) -> None:
+        if not self._profiler:
+            self._profiler = MaggieColumnsProfiler.FrameProfiler()
+        self._show_overlay = not self._show_overlay
+        self._full_redraw = True # Either draws the overlay, or clears it away.
+
+    def _draw_overlay(self, refresh: bool = True) -> pygame.Rect:
+        """Draw the profiling summary of the last few seconds in the upper left corner. Return the area that was drawn to.
+        Without refresh, the summary is drawn as it was last time.
+        """
+        if not refresh and self._overlay_surface is not None:
+            return self._surface.blit(self._overlay_surface, (8, 8))
+        if self._overlay_font is None:
+            self._overlay_font = pygame.font.Font(None, 20)
+        summary = self._profiler.summary()
+        frame, latency = summary['frame_ms'], summary['latency_ms']
+        lines = [
+            f"frame ms  p50 {frame['p50']:.1f}  p95 {frame['p95']:.1f}  p99 {frame['p99']:.1f}  max {frame['max']:.1f}",
+            f"input ms  p50 {latency['p50']:.1f}  p95 {latency['p95']:.1f}  max {latency['max']:.1f}  ({latency['count']} keys)",
+        ]
+        # The sections, slowest first, as mean and maximum milliseconds per frame.
+        sections = sorted(summary['sections_ms'].items(), key=lambda item: item[1]['mean'], reverse=True)
+        lines += [f"{name}  {times['mean']:.2f} / {times['max']:.2f}" for name, times in sections]
+        rendered = [self._overlay_font.render(line, True, (255, 255, 255)) for line in lines]
+        line_height = self._overlay_font.get_linesize()
+        overlay = pygame.Surface((max(text.get_width() for text in rendered) + 12, line_height * len(rendered) + 12), pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 170))
+        for index, text in enumerate(rendered):
+            overlay.blit(text, (6, 6 + index * line_height))
+        self._overlay_drawn_at = pygame.time.get_ticks()
+        self._overlay_surface = overlay
+        return self._surface.blit(overlay, (8, 8))
+
     def _reset_cached_score_surface(self) -> None:
         """Delete the cached score font object so that a new one can be created."""
         self._score_surface = None
 
 
 if __name__ == '__main__':
-    MaggieGame().run()
+    parser = argparse.ArgumentParser(description='Play MaggieColumns.')
+    parser.add_argument('--auto', action='store_true', help='let the computer play')
+    parser.add_argument('--seed', type=int, default=None, help='non-negative seed for the pieces and spawn columns (default: random)')
+    parser.add_argument('--record', default=None, metavar='FILE', help='record the game to FILE, to be replayed with MaggieColumnsReplay.py')
+    parser.add_argument('--profile', default=None, metavar='FILE',
+                        help='time every frame and write the timings to FILE: a Chrome trace if it ends in .json, CSV otherwise')
+    parser.add_argument('--columns', type=int, default=MaggieColumnsModel.NUMBER_OF_COLUMNS, help='width of the board')
+    parser.add_argument('--rows', type=int, default=MaggieColumnsModel.NUMBER_OF_ROWS, help='visible height of the board')
+    parser.add_argument('--faller-length', type=int, default=MaggieColumnsModel.FALLER_LENGTH, help='pieces in a faller')
+    parser.add_argument('--match-length', type=int, default=MaggieColumnsModel.MATCH_LENGTH, help='pieces in a line that make a match')
+    parser.add_argument('--vsync', action='store_true', help="wait for the monitor's refresh to show each frame, if the display can")
+    parser.add_argument('--startup-report', action='store_true', help='print how long the first frame and the images took to appear')
+    args = parser.parse_args()
+    auto_player = None
+    if args.auto: # Let the computer play.
+        import MaggieColumnsAI
+        auto_player = MaggieColumnsAI.AutoPlayer(beam_width=4)
+    board = MaggieColumnsModel.Board(args.columns, args.rows, faller_length=args.faller_length, match_length=args.match_length)
+    game = MaggieGame(vsync=args.vsync, auto_player=auto_player, seed=args.seed, record_to=args.record, profile_to=args.profile, board=board)
+    game.run()
+    if args.startup_report:
+        for name, seconds in game.startup_times().items():
+            print(f'{name}: ' + ('not reached' if seconds is None else f'{seconds * 1000:.0f} ms'))
 